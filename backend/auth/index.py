@@ -7,11 +7,147 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 import hashlib
+import hmac
+import base64
+import time
 import secrets
 
+SESSION_TOKEN_TTL = 15 * 60
+SESSION_REFRESH_WINDOW = 7 * 24 * 60 * 60
+REMEMBER_TOKEN_TTL_DAYS = 30
+SESSION_SWEEP_BATCH = 1000
+SESSION_SWEEP_MAX_BATCHES = 20
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 200
+TRIGRAM_MIN_LENGTH = 3
+LOGIN_THROTTLED_PATHS = ('login', 'check-remember')
+LOGIN_BUCKET_CAPACITY = 10
+LOGIN_BUCKET_REFILL_PER_SEC = 0.2
+LOGIN_BUCKETS_MAX_SIZE = 10000
+LOGIN_BUCKETS_EVICT_TO = 7500
+LOGIN_WINDOW_SECONDS = 60
+LOGIN_WINDOW_LIMITS = {'ip': 30, 'email': 10}
+LOGIN_ATTEMPTS_CLEANUP_INTERVAL = 60
+BULK_MODERATION_ACTIONS = {
+    'verify': ('is_verified', True),
+    'unverify': ('is_verified', False),
+    'block': ('is_blocked', True),
+    'unblock': ('is_blocked', False)
+}
+BULK_MODERATION_MAX_IDS = 1000
+
+_login_buckets = {}
+_login_attempts_cleaned_at = 0.0
+DB_CONNECTION_MAX_IDLE = 60
+_conn = None
+_conn_used_at = 0.0
+
 def get_db_connection():
-    """Создание подключения к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Подключение к БД: тёплый экземпляр функции переиспользует соединение"""
+    global _conn, _conn_used_at
+    
+    now = time.monotonic()
+    if _conn is not None and (_conn.closed or now - _conn_used_at > DB_CONNECTION_MAX_IDLE):
+        reset_db_connection()
+    if _conn is None:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    _conn_used_at = now
+    return _conn
+
+def reset_db_connection():
+    """Закрыть соединение, чтобы следующий вызов открыл новое"""
+    global _conn
+    
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+# Прогрев соединения при загрузке модуля (холодный старт), а не в первом запросе
+if os.environ.get('DATABASE_URL'):
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        _conn = None
+
+def error_response(status_code: int, message: str) -> dict:
+    """Ответ с ошибкой и заданным HTTP-статусом"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def login_throttle_keys(ip_address, email):
+    """Ключи ограничения попыток входа: по IP и по email"""
+    keys = [('ip', f'ip:{ip_address}')]
+    if email:
+        keys.append(('email', f'email:{email.strip().lower()}'))
+    return keys
+
+def evict_login_buckets(now):
+    """Освободить место: сначала удаляются полные вёдра (они равны новому), затем самые полные"""
+    levels = {
+        key: min(LOGIN_BUCKET_CAPACITY, tokens + (now - updated_at) * LOGIN_BUCKET_REFILL_PER_SEC)
+        for key, (tokens, updated_at) in _login_buckets.items()
+    }
+    for key, level in levels.items():
+        if level >= LOGIN_BUCKET_CAPACITY:
+            del _login_buckets[key]
+    
+    # Опустевшие вёдра (те, кого сейчас ограничивают) удаляются последними
+    excess = len(_login_buckets) - LOGIN_BUCKETS_EVICT_TO
+    if excess > 0:
+        for key in sorted(_login_buckets, key=levels.get, reverse=True)[:excess]:
+            del _login_buckets[key]
+
+def take_login_tokens(keys) -> bool:
+    """Локальный token bucket: отсекает всплески без обращения к БД"""
+    now = time.monotonic()
+    buckets = []
+    
+    for _, key in keys:
+        tokens, updated_at = _login_buckets.get(key, (LOGIN_BUCKET_CAPACITY, now))
+        tokens = min(LOGIN_BUCKET_CAPACITY, tokens + (now - updated_at) * LOGIN_BUCKET_REFILL_PER_SEC)
+        if tokens < 1:
+            return False
+        buckets.append((key, tokens))
+    
+    if len(_login_buckets) > LOGIN_BUCKETS_MAX_SIZE:
+        evict_login_buckets(now)
+    for key, tokens in buckets:
+        _login_buckets[key] = (tokens - 1, now)
+    return True
+
+def register_login_attempts(conn, keys) -> bool:
+    """Общий счётчик попыток по окнам для всех экземпляров функции"""
+    global _login_attempts_cleaned_at
+    
+    window_start = datetime.fromtimestamp(int(time.time()) // LOGIN_WINDOW_SECONDS * LOGIN_WINDOW_SECONDS)
+    limits = {key: LOGIN_WINDOW_LIMITS[kind] for kind, key in keys}
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            INSERT INTO login_attempts (key, window_start, attempts)
+            SELECT unnest(%s::varchar[]), %s, 1
+            ON CONFLICT (key, window_start)
+            DO UPDATE SET attempts = login_attempts.attempts + 1
+            RETURNING key, attempts
+        """, (list(limits), window_start))
+        counters = cur.fetchall()
+        
+        if time.monotonic() - _login_attempts_cleaned_at > LOGIN_ATTEMPTS_CLEANUP_INTERVAL:
+            _login_attempts_cleaned_at = time.monotonic()
+            cur.execute(
+                "DELETE FROM login_attempts WHERE window_start < %s",
+                (window_start - timedelta(seconds=LOGIN_WINDOW_SECONDS),)
+            )
+        conn.commit()
+    
+    return all(row['attempts'] <= limits[row['key']] for row in counters)
 
 def hash_password(password: str) -> str:
     """Хеширование пароля"""
@@ -21,6 +157,73 @@ def generate_token() -> str:
     """Генерация токена для 'Запомнить меня'"""
     return secrets.token_urlsafe(32)
 
+def hash_token(token: str) -> str:
+    """Хеш токена 'Запомнить меня' для хранения в sessions"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_remember_session(cur, user_id, device, ip_address) -> str:
+    """Создать сессию устройства и вернуть токен 'Запомнить меня'"""
+    remember_token = generate_token()
+    cur.execute("""
+        INSERT INTO sessions (token_hash, user_id, device, ip_address, expires_at)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (
+        hash_token(remember_token),
+        user_id,
+        device[:255] if device else None,
+        ip_address,
+        datetime.now() + timedelta(days=REMEMBER_TOKEN_TTL_DAYS)
+    ))
+    return remember_token
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign(body: str, secret: str) -> str:
+    return _b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest())
+
+def issue_session_token(user, sid=None):
+    """Выпуск подписанного токена сессии (uid, sid устройства, админ, блокировка, подписка)"""
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret:
+        return None
+    
+    now = int(time.time())
+    subscription_ends_at = user.get('subscription_ends_at')
+    claims = {
+        'uid': user['id'],
+        'sid': sid or secrets.token_urlsafe(12),
+        'adm': bool(user.get('is_admin')),
+        'blk': bool(user.get('is_blocked')),
+        'sub': int(subscription_ends_at.timestamp()) if subscription_ends_at else None,
+        'iat': now,
+        'exp': now + SESSION_TOKEN_TTL
+    }
+    body = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{body}.{_sign(body, secret)}'
+
+def verify_session_token(token, expired_grace: int = 0):
+    """Проверка подписи и срока действия токена сессии без обращения к БД"""
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret or not token or '.' not in token:
+        return None
+    
+    body, signature = token.rsplit('.', 1)
+    if not hmac.compare_digest(signature.encode(), _sign(body, secret).encode()):
+        return None
+    
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    
+    if claims.get('exp', 0) + expired_grace < time.time():
+        return None
+    return claims
+
 def handler(event: dict, context) -> dict:
     """Обработчик API запросов для авторизации"""
     method = event.get('httpMethod', 'GET')
@@ -31,28 +234,45 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    headers = event.get('headers', {})
+    session_token = headers.get('x-session-token') or headers.get('X-Session-Token')
     path = event.get('queryStringParameters', {}).get('path', '')
     request_context = event.get('requestContext', {})
     ip_address = request_context.get('identity', {}).get('sourceIp', '')
+    user_agent = headers.get('user-agent') or headers.get('User-Agent') or ''
     
     try:
-        conn = get_db_connection()
         body = json.loads(event.get('body', '{}'))
         
+        throttled = method == 'POST' and path in LOGIN_THROTTLED_PATHS
+        if throttled:
+            throttle_keys = login_throttle_keys(ip_address, body.get('email') if path == 'login' else None)
+            if not take_login_tokens(throttle_keys):
+                return error_response(429, 'Слишком много попыток входа. Попробуйте позже')
+        
+        conn = get_db_connection()
+        
+        if throttled and not register_login_attempts(conn, throttle_keys):
+            return error_response(429, 'Слишком много попыток входа. Попробуйте позже')
+        
         if method == 'POST':
             if path == 'register':
-                result = register_user(conn, body, ip_address)
+                result = register_user(conn, body, ip_address, user_agent)
             elif path == 'login':
-                result = login_user(conn, body, ip_address)
+                result = login_user(conn, body, ip_address, user_agent)
             elif path == 'check-remember':
                 result = check_remember_token(conn, body, ip_address)
+            elif path == 'refresh':
+                result = refresh_session(conn, body)
+            elif path == 'logout':
+                result = logout_user(conn, body)
             elif path == 'update-profile':
                 result = update_profile(conn, body)
             elif path == 'admin/verify-user':
@@ -61,20 +281,28 @@ def handler(event: dict, context) -> dict:
                 result = admin_block_user(conn, body)
             elif path == 'admin/get-users':
                 result = admin_get_users(conn, body)
+            elif path == 'admin/bulk-moderate':
+                result = admin_bulk_moderate(conn, verify_session_token(session_token), body)
+            elif path == 'admin/sweep-sessions':
+                result = admin_sweep_sessions(conn, body)
             else:
                 result = {'error': 'Invalid path'}
         
         elif method == 'GET':
             if path == 'check-subscription':
                 user_id = event.get('queryStringParameters', {}).get('user_id')
-                result = check_subscription(conn, user_id)
+                session = verify_session_token(session_token)
+                if session:
+                    result = subscription_from_session(session)
+                else:
+                    result = check_subscription(conn, user_id)
             else:
                 result = {'error': 'Invalid path'}
         
         else:
             result = {'error': 'Method not allowed'}
         
-        conn.close()
+        conn.rollback()
         
         return {
             'statusCode': 200,
@@ -87,6 +315,7 @@ def handler(event: dict, context) -> dict:
         }
     
     except Exception as e:
+        reset_db_connection()
         return {
             'statusCode': 500,
             'headers': {
@@ -97,7 +326,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-def register_user(conn, body, ip_address):
+def register_user(conn, body, ip_address, user_agent=''):
     """Регистрация нового пользователя"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("SELECT id FROM users WHERE email = %s", (body['email'],))
@@ -105,32 +334,41 @@ def register_user(conn, body, ip_address):
             return {'error': 'Пользователь с таким email уже существует'}
         
         password_hash = hash_password(body['password'])
-        remember_token = generate_token() if body.get('remember_me') else None
         subscription_ends_at = datetime.now() + timedelta(days=7)
         
         cur.execute("""
             INSERT INTO users (
                 username, email, password_hash, phone_number, 
-                is_premium, subscription_ends_at, ip_address, remember_token
+                is_premium, subscription_ends_at, ip_address
             )
-            VALUES (%s, %s, %s, %s, TRUE, %s, %s, %s)
+            VALUES (%s, %s, %s, %s, TRUE, %s, %s)
             RETURNING id, username, email, avatar_url, is_premium, premium_icon, 
-                      subscription_ends_at, is_blocked, remember_token
+                      subscription_ends_at, is_blocked, is_admin
         """, (
             body['username'],
             body['email'],
             password_hash,
             body.get('phone_number'),
             subscription_ends_at,
-            ip_address,
-            remember_token
+            ip_address
         ))
         user = cur.fetchone()
+        
+        remember_token = None
+        if body.get('remember_me'):
+            remember_token = create_remember_session(
+                cur, user['id'], body.get('device') or user_agent, ip_address
+            )
         conn.commit()
         
-        return {'success': True, 'user': user, 'remember_token': remember_token}
+        return {
+            'success': True,
+            'user': user,
+            'remember_token': remember_token,
+            'session_token': issue_session_token(user)
+        }
 
-def login_user(conn, body, ip_address):
+def login_user(conn, body, ip_address, user_agent=''):
     """Вход пользователя"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         password_hash = hash_password(body['password'])
@@ -154,44 +392,109 @@ def login_user(conn, body, ip_address):
         
         remember_token = None
         if body.get('remember_me'):
-            remember_token = generate_token()
-            cur.execute("""
-                UPDATE users SET remember_token = %s, ip_address = %s
-                WHERE id = %s
-            """, (remember_token, ip_address, user['id']))
+            remember_token = create_remember_session(
+                cur, user['id'], body.get('device') or user_agent, ip_address
+            )
             conn.commit()
         
-        return {'success': True, 'user': user, 'remember_token': remember_token}
+        return {
+            'success': True,
+            'user': user,
+            'remember_token': remember_token,
+            'session_token': issue_session_token(user)
+        }
 
 def check_remember_token(conn, body, ip_address):
     """Проверка токена 'Запомнить меня'"""
+    token = body.get('token')
+    if not token:
+        return {'success': False}
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
-            SELECT id, username, email, avatar_url, is_premium, premium_icon,
-                   subscription_ends_at, is_blocked, is_admin
-            FROM users
-            WHERE remember_token = %s AND ip_address = %s
-        """, (body.get('token'), ip_address))
+            UPDATE sessions s
+            SET last_seen = CURRENT_TIMESTAMP, ip_address = %s
+            FROM users u
+            WHERE s.token_hash = %s AND s.expires_at > CURRENT_TIMESTAMP AND u.id = s.user_id
+            RETURNING u.id, u.username, u.email, u.avatar_url, u.is_premium, u.premium_icon,
+                      u.subscription_ends_at, u.is_blocked, u.is_admin
+        """, (ip_address, hash_token(token)))
         user = cur.fetchone()
+        conn.commit()
         
-        if user:
-            if user['is_blocked']:
-                return {'error': 'Аккаунт заблокирован'}
-            if user['subscription_ends_at'] and datetime.now() > user['subscription_ends_at']:
-                return {'error': 'Подписка истекла'}
-            return {'success': True, 'user': user}
-        
+        if not user:
+            return {'success': False}
+        if user['is_blocked']:
+            return {'error': 'Аккаунт заблокирован'}
+        if user['subscription_ends_at'] and datetime.now() > user['subscription_ends_at']:
+            return {'error': 'Подписка истекла'}
+        return {'success': True, 'user': user, 'session_token': issue_session_token(user)}
+
+def refresh_session(conn, body):
+    """Обновление токена сессии с проверкой списка отзыва"""
+    claims = verify_session_token(body.get('session_token'), expired_grace=SESSION_REFRESH_WINDOW)
+    if not claims or not claims.get('sid'):
+        return {'error': 'Сессия недействительна'}
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
-            SELECT id, username, email, avatar_url, is_premium, premium_icon,
-                   subscription_ends_at, is_blocked, remember_token, is_admin
-            FROM users
-            WHERE ip_address = %s AND remember_token IS NOT NULL AND is_blocked = FALSE
-            ORDER BY created_at DESC
-            LIMIT 3
-        """, (ip_address,))
-        suggestions = cur.fetchall()
-        
-        return {'success': False, 'suggestions': suggestions}
+            SELECT u.id, u.is_admin, u.is_blocked, u.subscription_ends_at, r.revoked_before,
+                EXISTS(SELECT 1 FROM revoked_session_ids WHERE sid = %s) as sid_revoked
+            FROM users u
+            LEFT JOIN session_revocations r ON r.user_id = u.id
+            WHERE u.id = %s
+        """, (claims['sid'], claims['uid']))
+        user = cur.fetchone()
+        conn.commit()
+    
+    if not user:
+        return {'error': 'User not found'}
+    # iat округлён до секунды вниз, поэтому и момент отзыва сравнивается с точностью до секунды:
+    # токен, выпущенный в ту же секунду сразу после выхода, не считается отозванным
+    if user['sid_revoked'] or (
+        user['revoked_before'] and claims['iat'] < int(user['revoked_before'].timestamp())
+    ):
+        return {'error': 'Сессия отозвана'}
+    if user['is_blocked']:
+        return {'error': 'Аккаунт заблокирован'}
+    if user['subscription_ends_at'] and datetime.now() > user['subscription_ends_at']:
+        return {'error': 'Подписка истекла'}
+    
+    return {'success': True, 'session_token': issue_session_token(user, claims['sid'])}
+
+def revoke_sessions(cur, user_id):
+    """Отозвать все выпущенные ранее токены пользователя"""
+    cur.execute("""
+        INSERT INTO session_revocations (user_id, revoked_before)
+        VALUES (%s, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id) DO UPDATE SET revoked_before = EXCLUDED.revoked_before
+    """, (user_id,))
+
+def logout_user(conn, body):
+    """Выход: отзыв токена и сессии этого устройства (everywhere — всех устройств пользователя)"""
+    claims = verify_session_token(body.get('session_token'), expired_grace=SESSION_REFRESH_WINDOW)
+    remember_token = body.get('remember_token')
+    if not claims and not remember_token:
+        return {'error': 'Сессия недействительна'}
+    if body.get('everywhere') and not claims:
+        return {'error': 'Сессия недействительна'}
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if remember_token:
+            cur.execute("DELETE FROM sessions WHERE token_hash = %s", (hash_token(remember_token),))
+        if claims and body.get('everywhere'):
+            revoke_sessions(cur, claims['uid'])
+            cur.execute("DELETE FROM sessions WHERE user_id = %s", (claims['uid'],))
+        elif claims and claims.get('sid'):
+            # Токен этого устройства больше нельзя обновить; строка нужна до конца окна обновления
+            cur.execute("""
+                INSERT INTO revoked_session_ids (sid, user_id, expires_at)
+                VALUES (%s, %s, to_timestamp(%s))
+                ON CONFLICT (sid) DO NOTHING
+            """, (claims['sid'], claims['uid'], claims['exp'] + SESSION_REFRESH_WINDOW))
+        conn.commit()
+    
+    return {'success': True}
 
 def update_profile(conn, body):
     """Обновление профиля пользователя"""
@@ -250,6 +553,19 @@ def check_subscription(conn, user_id):
             'subscription_ends_at': user['subscription_ends_at']
         }
 
+def subscription_from_session(claims):
+    """Статус подписки по данным токена сессии"""
+    now = time.time()
+    is_active = not claims['blk'] and (not claims['sub'] or now < claims['sub'])
+    subscription_ends_at = datetime.fromtimestamp(claims['sub']) if claims['sub'] else None
+    
+    return {
+        'is_active': is_active,
+        'is_blocked': claims['blk'],
+        'days_left': max(0, int((claims['sub'] - now) // 86400)) if claims['sub'] else 0,
+        'subscription_ends_at': subscription_ends_at
+    }
+
 def admin_verify_user(conn, body):
     """Админ: выдать галочку верификации"""
     admin_id = body.get('admin_id')
@@ -289,14 +605,97 @@ def admin_block_user(conn, body):
             RETURNING id, username, is_blocked
         """, (is_blocked, target_user_id))
         user = cur.fetchone()
+        if user and is_blocked:
+            revoke_sessions(cur, user['id'])
+            cur.execute("DELETE FROM sessions WHERE user_id = %s", (user['id'],))
         conn.commit()
         
         return {'success': True, 'user': user}
 
+def escape_like(value: str) -> str:
+    """Экранирование спецсимволов LIKE"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def parse_int(value):
+    """Целое из JSON (число или строка из цифр) или None"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return None
+
+def user_filters_error(body):
+    """Сообщение об ошибке в фильтрах поиска пользователей или None"""
+    if body.get('search') is not None and not isinstance(body['search'], str):
+        return 'search must be a string'
+    for field in ('is_blocked', 'is_premium', 'is_verified'):
+        if body.get(field) is not None and not isinstance(body[field], bool):
+            return f'{field} must be true or false'
+    if body.get('expiring_within_days') is not None:
+        days = parse_int(body['expiring_within_days'])
+        if days is None or days < 0:
+            return 'expiring_within_days must be a non-negative integer'
+    return None
+
+def build_user_filters(body):
+    """Условия поиска пользователей для админки (под индексы pg_trgm)"""
+    conditions = []
+    params = []
+    search = (body.get('search') or '').strip()
+    
+    if len(search) >= TRIGRAM_MIN_LENGTH:
+        pattern = f'%{escape_like(search)}%'
+        conditions.append('(username ILIKE %s OR email ILIKE %s)')
+        params.extend([pattern, pattern])
+    elif search:
+        pattern = f'{escape_like(search.lower())}%'
+        conditions.append('(lower(username) LIKE %s OR lower(email) LIKE %s)')
+        params.extend([pattern, pattern])
+    
+    for field in ('is_blocked', 'is_premium', 'is_verified'):
+        if body.get(field) is not None:
+            conditions.append(f'{field} = %s')
+            params.append(body[field])
+    
+    if body.get('expiring_within_days') is not None:
+        conditions.append(
+            "subscription_ends_at BETWEEN CURRENT_TIMESTAMP "
+            "AND CURRENT_TIMESTAMP + %s * INTERVAL '1 day'"
+        )
+        params.append(parse_int(body['expiring_within_days']))
+    
+    return conditions, params
+
+def admin_users_query(body, cursor, page_size):
+    """SQL и параметры страницы поиска пользователей для админки"""
+    conditions, params = build_user_filters(body)
+    if cursor:
+        conditions.append('(created_at, id) < (%s, %s)')
+        params.extend([cursor['created_at'], cursor['id']])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    return f"""
+        SELECT id, username, email, phone_number, is_premium, is_blocked, 
+               is_verified, subscription_ends_at, created_at
+        FROM users
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, params + [page_size + 1]
+
 def admin_get_users(conn, body):
-    """Админ: получить список пользователей"""
+    """Админ: поиск пользователей с фильтрами и keyset-пагинацией"""
     admin_id = body.get('admin_id')
-    search = body.get('search', '')
+    limit = parse_int(body['limit']) if body.get('limit') else ADMIN_USERS_PAGE_SIZE
+    if limit is None:
+        return {'error': 'limit must be an integer'}
+    page_size = max(1, min(limit, ADMIN_USERS_MAX_PAGE_SIZE))
+    cursor = body.get('cursor')
+    if cursor and not (isinstance(cursor, dict) and cursor.get('created_at') and cursor.get('id')):
+        return {'error': 'Invalid cursor'}
+    filters_error = user_filters_error(body)
+    if filters_error:
+        return {'error': filters_error}
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("SELECT is_admin FROM users WHERE id = %s", (admin_id,))
@@ -305,15 +704,151 @@ def admin_get_users(conn, body):
         if not admin or not admin['is_admin']:
             return {'error': 'Access denied'}
         
-        cur.execute("""
-            SELECT id, username, email, phone_number, is_premium, is_blocked, 
-                   is_verified, subscription_ends_at, created_at
-            FROM users
-            WHERE username ILIKE %s OR email ILIKE %s
-            ORDER BY created_at DESC
-            LIMIT 100
-        """, (f'%{search}%', f'%{search}%'))
+        cur.execute(*admin_users_query(body, cursor, page_size))
         users = cur.fetchall()
         conn.commit()
         
-        return {'success': True, 'users': users}
+        next_cursor = None
+        if len(users) > page_size:
+            users = users[:page_size]
+            next_cursor = {'created_at': users[-1]['created_at'], 'id': users[-1]['id']}
+        
+        return {'success': True, 'users': users, 'next_cursor': next_cursor}
+
+def bulk_moderation_query(action, conditions, params, dry_run=False):
+    """SQL и параметры массовой модерации по условиям отбора пользователей"""
+    column, value = BULK_MODERATION_ACTIONS[action]
+    conditions = conditions + [f'{column} IS DISTINCT FROM %s']
+    params = params + [value]
+    if action == 'block':
+        conditions.append('is_admin IS NOT TRUE')
+    where = ' AND '.join(conditions)
+    
+    if dry_run:
+        return f"SELECT COUNT(*) as count FROM users WHERE {where}", params
+    
+    # За один запрос — не больше BULK_MODERATION_MAX_IDS пользователей; обработанные перестают
+    # подходить под условие, поэтому повтор того же запроса продолжает с оставшихся
+    where = f"id IN (SELECT id FROM users WHERE {where} LIMIT %s)"
+    params = params + [BULK_MODERATION_MAX_IDS]
+    
+    if action == 'block':
+        return f"""
+            WITH updated AS (
+                UPDATE users SET is_blocked = TRUE WHERE {where}
+                RETURNING id, username, is_verified, is_blocked
+            ), revoked AS (
+                INSERT INTO session_revocations (user_id, revoked_before)
+                SELECT id, CURRENT_TIMESTAMP FROM updated
+                ON CONFLICT (user_id) DO UPDATE SET revoked_before = EXCLUDED.revoked_before
+            ), dropped AS (
+                DELETE FROM sessions WHERE user_id IN (SELECT id FROM updated)
+            )
+            SELECT * FROM updated
+        """, params
+    
+    return f"""
+        UPDATE users SET {column} = %s WHERE {where}
+        RETURNING id, username, is_verified, is_blocked
+    """, [value] + params
+
+def admin_bulk_moderate(conn, session, body):
+    """Админ: массовая верификация/блокировка по списку ID или фильтру поиска (админ — из токена сессии)"""
+    action = body.get('action')
+    user_ids = body.get('user_ids')
+    filters = body.get('filter')
+    
+    if not session or not session['adm']:
+        return {'error': 'Access denied'}
+    if action not in BULK_MODERATION_ACTIONS:
+        return {'error': 'Unknown action'}
+    
+    if user_ids is not None and not isinstance(user_ids, list):
+        return {'error': 'user_ids must be a list'}
+    if filters is not None and not isinstance(filters, dict):
+        return {'error': 'filter must be an object'}
+    
+    if user_ids:
+        if len(user_ids) > BULK_MODERATION_MAX_IDS:
+            return {'error': f'Too many user_ids (max {BULK_MODERATION_MAX_IDS})'}
+        ids = [parse_int(uid) for uid in user_ids]
+        if None in ids:
+            return {'error': 'user_ids must be integers'}
+        conditions, params = ['id = ANY(%s)'], [ids]
+    elif filters:
+        filters_error = user_filters_error(filters)
+        if filters_error:
+            return {'error': filters_error}
+        conditions, params = build_user_filters(filters)
+        if not conditions:
+            return {'error': 'Filter is empty'}
+    else:
+        return {'error': 'user_ids or filter required'}
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Права админа могли отозвать после выпуска токена
+        cur.execute("SELECT is_admin FROM users WHERE id = %s", (session['uid'],))
+        admin = cur.fetchone()
+        
+        if not admin or not admin['is_admin']:
+            return {'error': 'Access denied'}
+        
+        dry_run = bool(body.get('dry_run'))
+        cur.execute(*bulk_moderation_query(action, conditions, params, dry_run))
+        if dry_run:
+            count = cur.fetchone()['count']
+            conn.commit()
+            return {'success': True, 'dry_run': True, 'count': count}
+        
+        users = cur.fetchall()
+        conn.commit()
+        
+        return {
+            'success': True,
+            'count': len(users),
+            'users': users,
+            'has_more': len(users) == BULK_MODERATION_MAX_IDS
+        }
+
+def sweep_expired_sessions(conn, batch_size: int = SESSION_SWEEP_BATCH, max_batches: int = SESSION_SWEEP_MAX_BATCHES):
+    """Удаление просроченных сессий и отзывов sid пачками (не больше max_batches): (удалено сессий, остались ли ещё)"""
+    deleted = 0
+    with conn.cursor() as cur:
+        for _ in range(max_batches):
+            cur.execute("""
+                DELETE FROM sessions
+                WHERE id IN (
+                    SELECT id FROM sessions
+                    WHERE expires_at < CURRENT_TIMESTAMP
+                    LIMIT %s
+                )
+            """, (batch_size,))
+            sessions_deleted = cur.rowcount
+            cur.execute("""
+                DELETE FROM revoked_session_ids
+                WHERE sid IN (
+                    SELECT sid FROM revoked_session_ids
+                    WHERE expires_at < CURRENT_TIMESTAMP
+                    LIMIT %s
+                )
+            """, (batch_size,))
+            revocations_deleted = cur.rowcount
+            conn.commit()
+            deleted += sessions_deleted
+            if sessions_deleted < batch_size and revocations_deleted < batch_size:
+                return deleted, False
+    return deleted, True
+
+def admin_sweep_sessions(conn, body):
+    """Админ: очистить просроченные сессии"""
+    admin_id = body.get('admin_id')
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT is_admin FROM users WHERE id = %s", (admin_id,))
+        admin = cur.fetchone()
+        
+        if not admin or not admin['is_admin']:
+            return {'error': 'Access denied'}
+    
+    deleted, has_more = sweep_expired_sessions(conn)
+    return {'success': True, 'deleted': deleted, 'has_more': has_more}
@@ -0,0 +1,200 @@
+"""
+Асинхронный режим функции businesses: asyncio и пул соединений asyncpg.
+Независимые запросы чтения выполняются параллельно, а один процесс обслуживает
+много запросов одновременно. Запуск за локальным ASGI-сервером:
+
+    uvicorn asgi:app --app-dir backend/businesses
+
+Запросы и аутентификация общие с index.py, поэтому ответы совпадают с синхронным
+handler(). Маршруты записи обслуживает сам index.handler() в отдельном потоке.
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import asyncpg
+
+import index
+
+ASYNC_POOL_MIN_SIZE = 1
+ASYNC_POOL_MAX_SIZE = 10
+
+_pool = None
+_pool_lock = asyncio.Lock()
+# index.handler() держит одно соединение на процесс, поэтому синхронные маршруты идут через один поток
+_sync_executor = ThreadPoolExecutor(max_workers=1)
+
+def to_asyncpg(sql: str) -> str:
+    """Замена плейсхолдеров psycopg2 (%s) на $1, $2, ..."""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub('%s', lambda _: f'${next(counter)}', sql)
+
+USER_SUMMARIES_SQL = to_asyncpg(index.USER_SUMMARIES_SQL)
+USER_BUSINESSES_SQL = to_asyncpg(index.USER_BUSINESSES_SQL)
+BUSINESS_DETAILS_SQL = to_asyncpg(index.BUSINESS_DETAILS_SQL)
+BUSINESS_MEMBERS_SQL = to_asyncpg(index.BUSINESS_MEMBERS_SQL)
+BUSINESS_NOTE_SQL = to_asyncpg(index.BUSINESS_NOTE_SQL)
+TRANSACTIONS_SQL = to_asyncpg(index.TRANSACTIONS_SQL)
+CHAT_MESSAGES_SQL = to_asyncpg(index.CHAT_MESSAGES_SQL)
+ACTIVE_ADVERTISEMENT_SQL = to_asyncpg(index.ACTIVE_ADVERTISEMENT_SQL)
+
+async def _init_connection(conn):
+    """JSON-поля декодируются в dict, как у psycopg2"""
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+async def get_pool():
+    """Пул соединений asyncpg (создаётся один раз на процесс)"""
+    global _pool
+    
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                os.environ['DATABASE_URL'],
+                min_size=ASYNC_POOL_MIN_SIZE,
+                max_size=ASYNC_POOL_MAX_SIZE,
+                init=_init_connection
+            )
+    return _pool
+
+async def fetch(sql, *args):
+    """Строки результата как dict"""
+    pool = await get_pool()
+    return [dict(row) for row in await pool.fetch(sql, *args)]
+
+async def fetchrow(sql, *args):
+    """Первая строка результата как dict или None"""
+    pool = await get_pool()
+    row = await pool.fetchrow(sql, *args)
+    return dict(row) if row else None
+
+def _int_or_none(value):
+    """asyncpg не приводит строки к integer сам, в отличие от psycopg2"""
+    return int(value) if value is not None else None
+
+async def attach_user_summaries(rows, key='user_id', fields=index.USER_SUMMARY_FIELDS):
+    """Добавить к строкам поля профиля автора (общий кеш с синхронным режимом)"""
+    summaries, missing = index.cached_user_summaries([row[key] for row in rows])
+    if missing:
+        index.remember_user_summaries(await fetch(USER_SUMMARIES_SQL, missing), summaries)
+    return index.apply_user_summaries(rows, summaries, key, fields)
+
+async def get_user_businesses(user_id):
+    """Получить все бизнесы пользователя (свои + участник)"""
+    if not user_id:
+        return {'error': 'User ID required'}
+    
+    businesses = await fetch(USER_BUSINESSES_SQL, user_id, user_id)
+    return {'businesses': businesses}
+
+async def get_business_details(business_id):
+    """Получить детальную информацию о бизнесе: три запроса выполняются параллельно"""
+    business_id = int(business_id)
+    business, members, note = await asyncio.gather(
+        fetchrow(BUSINESS_DETAILS_SQL, business_id),
+        fetch(BUSINESS_MEMBERS_SQL, business_id),
+        fetchrow(BUSINESS_NOTE_SQL, business_id)
+    )
+    
+    if not business:
+        return {'error': 'Business not found'}
+    
+    business['members'] = await attach_user_summaries(members, key='id')
+    business['note'] = note
+    return business
+
+async def get_transactions(business_id):
+    """Получить транзакции бизнеса"""
+    transactions = await fetch(TRANSACTIONS_SQL, _int_or_none(business_id))
+    return {'transactions': await attach_user_summaries(transactions, key='created_by', fields=('username',))}
+
+async def get_chat_messages(business_id):
+    """Получить сообщения чата"""
+    messages = await fetch(CHAT_MESSAGES_SQL, _int_or_none(business_id))
+    return {'messages': await attach_user_summaries(messages)}
+
+async def get_active_advertisement():
+    """Получить активную рекламу"""
+    return {'advertisement': await fetchrow(ACTIVE_ADVERTISEMENT_SQL)}
+
+def is_async_route(method: str, path: str) -> bool:
+    """Маршруты, которые асинхронный режим обслуживает сам"""
+    return method == 'GET' and (
+        path in ('businesses', 'transactions', 'chat', 'advertisement') or path.startswith('business/')
+    )
+
+async def async_handler(event: dict, context=None) -> dict:
+    """Асинхронный обработчик: маршруты чтения на asyncpg, остальные — через index.handler()"""
+    method = event.get('httpMethod', 'GET')
+    query = event.get('queryStringParameters', {})
+    path = query.get('path', '')
+    
+    if not is_async_route(method, path):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_sync_executor, index.handler, event, context)
+    
+    user_id, auth_error = index.authenticate(event.get('headers', {}))
+    if auth_error:
+        return auth_error
+    
+    try:
+        if path == 'businesses':
+            result = await get_user_businesses(user_id)
+        elif path.startswith('business/'):
+            result = await get_business_details(path.split('/')[-1])
+        elif path == 'transactions':
+            result = await get_transactions(query.get('business_id'))
+        elif path == 'chat':
+            result = await get_chat_messages(query.get('business_id'))
+        else:
+            result = await get_active_advertisement()
+        
+        return index.json_response(result)
+    
+    except Exception as e:
+        return index.error_response(500, str(e))
+
+async def app(scope, receive, send):
+    """ASGI-адаптер: HTTP-запрос превращается в событие облачной функции"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if os.environ.get('DATABASE_URL'):
+                    await get_pool()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if _pool is not None:
+                    await _pool.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    if scope['type'] != 'http':
+        return
+    
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    
+    event = {
+        'httpMethod': scope['method'],
+        'headers': {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']},
+        'queryStringParameters': dict(parse_qsl(scope['query_string'].decode())),
+        'requestContext': {'identity': {'sourceIp': (scope.get('client') or ('',))[0]}}
+    }
+    if body:
+        event['body'] = body.decode()
+    
+    response = await async_handler(event)
+    await send({
+        'type': 'http.response.start',
+        'status': response['statusCode'],
+        'headers': [(name.lower().encode(), value.encode()) for name, value in response['headers'].items()]
+    })
+    await send({'type': 'http.response.body', 'body': response['body'].encode()})
@@ -3,21 +3,359 @@ API для управления бизнесами, транзакциями и
 """
 import json
 import os
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime
-import random
-import string
+
+USER_CACHE_TTL = 30
+USER_CACHE_MAX_SIZE = 10000
+_user_cache = {}
+USER_SUMMARY_FIELDS = ('username', 'avatar_url', 'is_premium')
+
+# Запросы чтения общие для синхронного handler() и асинхронного режима (asgi.py)
+USER_SUMMARIES_SQL = """
+    SELECT id, username, avatar_url, is_premium
+    FROM users
+    WHERE id = ANY(%s)
+"""
+
+USER_BUSINESSES_SQL = """
+    SELECT b.*, my.my_role,
+        COALESCE(r.transaction_count, 0) as transaction_count,
+        COALESCE(r.balance, 0) as balance
+    FROM (
+        SELECT DISTINCT ON (business_id) business_id, my_role
+        FROM (
+            SELECT id as business_id, 'owner' as my_role, 0 as priority
+            FROM businesses WHERE user_id = %s
+            UNION ALL
+            SELECT business_id, role, 1 FROM business_members WHERE user_id = %s
+        ) roles
+        ORDER BY business_id, priority
+    ) my
+    JOIN businesses b ON b.id = my.business_id
+    LEFT JOIN LATERAL (
+        SELECT SUM(transaction_count) as transaction_count, SUM(income - expense) as balance
+        FROM business_monthly_rollups
+        WHERE business_id = b.id
+    ) r ON TRUE
+    WHERE b.is_archived = FALSE
+    ORDER BY b.created_at DESC
+    LIMIT 20
+"""
+
+BUSINESS_DETAILS_SQL = """
+    SELECT b.*,
+        (SELECT COUNT(*) FROM business_members bm WHERE bm.business_id = b.id) as member_count,
+        (SELECT COALESCE(SUM(income - expense), 0) FROM business_monthly_rollups r
+         WHERE r.business_id = b.id) as balance
+    FROM businesses b
+    WHERE b.id = %s
+"""
+
+BUSINESS_MEMBERS_SQL = """
+    SELECT bm.user_id as id, bm.role
+    FROM business_members bm
+    WHERE bm.business_id = %s
+    ORDER BY bm.joined_at ASC
+"""
+
+BUSINESS_NOTE_SQL = """
+    SELECT * FROM business_notes WHERE business_id = %s ORDER BY updated_at DESC LIMIT 1
+"""
+
+TRANSACTIONS_SQL = """
+    SELECT t.*
+    FROM transactions t
+    WHERE t.business_id = %s
+    ORDER BY t.date DESC
+    LIMIT 500
+"""
+
+CHAT_MESSAGES_SQL = """
+    SELECT bc.*
+    FROM business_chat bc
+    WHERE bc.business_id = %s
+    ORDER BY bc.id ASC
+    LIMIT 500
+"""
+
+ACTIVE_ADVERTISEMENT_SQL = """
+    SELECT id, title, content, image_url, created_at
+    FROM advertisements
+    WHERE is_active = TRUE
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+OWNER_SUMMARY_MONTHS = 12
+OWNER_SUMMARY_MAX_MONTHS = 36
+BULK_TRANSACTIONS_MAX = 5000
+CHAT_RETENTION_DAYS = 90
+CHAT_RETENTION_MAX_DAYS = 3650
+CHAT_ARCHIVE_BATCH = 1000
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+IDEMPOTENCY_SWEEP_INTERVAL = 300
+IDEMPOTENCY_SWEEP_BATCH = 500
+_idempotency_swept_at = 0.0
+# Вход по X-User-Id без токена сессии оставлен для текущего клиента (src/lib/api.ts), который
+# не передаёт X-Session-Token. Блокировка и срок подписки проверяются только по токену, поэтому
+# после перехода клиента на токены флаг выключается (ALLOW_LEGACY_USER_ID=0), а ветка удаляется.
+ALLOW_LEGACY_USER_ID = os.environ.get('ALLOW_LEGACY_USER_ID', '1') == '1'
+DB_CONNECTION_MAX_IDLE = 60
+_conn = None
+_conn_used_at = 0.0
 
 def get_db_connection():
-    """Создание подключения к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Подключение к БД: тёплый экземпляр функции переиспользует соединение"""
+    global _conn, _conn_used_at
+    
+    now = time.monotonic()
+    if _conn is not None and (_conn.closed or now - _conn_used_at > DB_CONNECTION_MAX_IDLE):
+        reset_db_connection()
+    if _conn is None:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    _conn_used_at = now
+    return _conn
+
+def reset_db_connection():
+    """Закрыть соединение, чтобы следующий вызов открыл новое"""
+    global _conn
+    
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+# Прогрев соединения при загрузке модуля (холодный старт), а не в первом запросе
+if os.environ.get('DATABASE_URL'):
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        _conn = None
+
+# hmac, hashlib и base64 импортируются по месту: они нужны только запросам с токеном
+# или Idempotency-Key, а на холодном старте это самые тяжёлые импорты модуля
+def _b64encode(data: bytes) -> str:
+    import base64
+    
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    import base64
+    
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def verify_session_token(token):
+    """Проверка подписанного токена сессии без обращения к БД"""
+    import hashlib
+    import hmac
+    
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret or '.' not in token:
+        return None
+    
+    body, signature = token.rsplit('.', 1)
+    expected = _b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
+        return None
+    
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    
+    if claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+def error_response(status_code: int, message: str) -> dict:
+    """Ответ с ошибкой и заданным HTTP-статусом"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def authenticate(headers):
+    """Пользователь запроса по токену сессии (или X-User-Id): (user_id, ответ с ошибкой)"""
+    session_token = headers.get('x-session-token') or headers.get('X-Session-Token')
+    
+    if session_token:
+        session = verify_session_token(session_token)
+        if not session:
+            return None, error_response(401, 'Сессия недействительна')
+        if session['blk']:
+            return None, error_response(403, 'Аккаунт заблокирован')
+        if session['sub'] and time.time() > session['sub']:
+            return None, error_response(403, 'Подписка истекла')
+        return session['uid'], None
+    
+    user_id_str = headers.get('x-user-id') or headers.get('X-User-Id')
+    if not user_id_str:
+        return None, None
+    if not ALLOW_LEGACY_USER_ID or not user_id_str.isdigit():
+        return None, error_response(401, 'Требуется токен сессии')
+    return int(user_id_str), None
+
+def json_response(result) -> dict:
+    """Успешный JSON-ответ"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(result, ensure_ascii=False, default=str),
+        'isBase64Encoded': False
+    }
+
+def cached_user_summaries(user_ids):
+    """Профили из кеша процесса: (найденные, ID которых нет в кеше)"""
+    now = time.monotonic()
+    summaries = {}
+    missing = []
+    
+    for user_id in {uid for uid in user_ids if uid is not None}:
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > now:
+            summaries[user_id] = cached[1]
+        else:
+            missing.append(user_id)
+    
+    return summaries, missing
+
+def remember_user_summaries(users, summaries):
+    """Положить загруженные из БД профили в кеш процесса"""
+    if len(_user_cache) > USER_CACHE_MAX_SIZE:
+        _user_cache.clear()
+    
+    expires_at = time.monotonic() + USER_CACHE_TTL
+    for user in users:
+        summary = dict(user)
+        _user_cache[summary['id']] = (expires_at, summary)
+        summaries[summary['id']] = summary
+    return summaries
+
+def load_user_summaries(conn, user_ids):
+    """Загрузить краткие профили пользователей одним запросом (с кешем)"""
+    summaries, missing = cached_user_summaries(user_ids)
+    
+    if missing:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(USER_SUMMARIES_SQL, (missing,))
+            remember_user_summaries(cur.fetchall(), summaries)
+    
+    return summaries
+
+def attach_user_summaries(conn, rows, key='user_id', fields=USER_SUMMARY_FIELDS):
+    """Добавить к строкам поля профиля автора"""
+    summaries = load_user_summaries(conn, [row[key] for row in rows])
+    return apply_user_summaries(rows, summaries, key, fields)
+
+def apply_user_summaries(rows, summaries, key='user_id', fields=USER_SUMMARY_FIELDS):
+    """Скопировать поля профиля в строки результата"""
+    for row in rows:
+        summary = summaries.get(row[key], {})
+        for field in fields:
+            row[field] = summary.get(field)
+    return rows
 
 def generate_online_code():
     """Генерация уникального кода для онлайн-бизнеса"""
+    import random
+    import string
+    
     chars = string.ascii_uppercase + string.digits
     return ''.join(random.choice(chars) for _ in range(20))
 
+def run_idempotent(conn, user_id, idempotency_key, endpoint, body, write):
+    """Выполнить запись не более одного раза на ключ Idempotency-Key: (результат, ответ-ошибка или None)"""
+    if not idempotency_key or not user_id:
+        result = write()
+        conn.commit()
+        return result, None
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, error_response(400, 'Idempotency-Key слишком длинный')
+    
+    import hashlib
+    
+    request_hash = hashlib.sha256(
+        json.dumps([endpoint, body], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Параллельный дубль ждёт на этой вставке, пока первый запрос не завершит транзакцию
+        cur.execute("""
+            INSERT INTO idempotency_keys (user_id, idempotency_key, endpoint, request_hash, expires_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+            ON CONFLICT (user_id, idempotency_key) DO UPDATE SET
+                endpoint = EXCLUDED.endpoint,
+                request_hash = EXCLUDED.request_hash,
+                response = NULL,
+                created_at = CURRENT_TIMESTAMP,
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+            RETURNING user_id
+        """, (user_id, idempotency_key, endpoint, request_hash, IDEMPOTENCY_TTL_HOURS))
+        
+        if not cur.fetchone():
+            cur.execute("""
+                SELECT request_hash, response FROM idempotency_keys
+                WHERE user_id = %s AND idempotency_key = %s
+            """, (user_id, idempotency_key))
+            stored = cur.fetchone()
+            conn.commit()
+            
+            if stored['request_hash'] != request_hash:
+                return None, error_response(409, 'Idempotency-Key уже использован для другого запроса')
+            if stored['response'] is None:
+                return None, error_response(409, 'Запрос с этим Idempotency-Key ещё выполняется')
+            return stored['response'], None
+        
+        # Ключ, запись и ответ фиксируются одним commit: повтор получает сохранённый ответ,
+        # а если запись откатилась, ключ освобождается вместе с ней
+        result = write()
+        cur.execute("""
+            UPDATE idempotency_keys SET response = %s
+            WHERE user_id = %s AND idempotency_key = %s
+        """, (json.dumps(result, ensure_ascii=False, default=str), user_id, idempotency_key))
+        conn.commit()
+    
+    sweep_idempotency_keys(conn)
+    return result, None
+
+def sweep_idempotency_keys(conn):
+    """Удалить пачку просроченных ключей не чаще раза в IDEMPOTENCY_SWEEP_INTERVAL (отдельной транзакцией)"""
+    global _idempotency_swept_at
+    
+    if time.monotonic() - _idempotency_swept_at < IDEMPOTENCY_SWEEP_INTERVAL:
+        return
+    _idempotency_swept_at = time.monotonic()
+    
+    # Срок проверяется повторно на самой строке: ключ могли заново занять после выборки,
+    # а SKIP LOCKED не ждёт строки, которые держат параллельные запросы
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM idempotency_keys
+                WHERE (user_id, idempotency_key) IN (
+                    SELECT user_id, idempotency_key FROM idempotency_keys
+                    WHERE expires_at < CURRENT_TIMESTAMP
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) AND expires_at < CURRENT_TIMESTAMP
+            """, (IDEMPOTENCY_SWEEP_BATCH,))
+            conn.commit()
+    except psycopg2.Error:
+        # Запись пользователя уже зафиксирована: сбой очистки не должен превращаться в 500
+        conn.rollback()
+
 def handler(event: dict, context) -> dict:
     """Обработчик API запросов для бизнесов"""
     method = event.get('httpMethod', 'GET')
@@ -28,7 +366,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -36,8 +374,10 @@ def handler(event: dict, context) -> dict:
         }
     
     headers = event.get('headers', {})
-    user_id_str = headers.get('x-user-id') or headers.get('X-User-Id')
-    user_id = int(user_id_str) if user_id_str else None
+    user_id, auth_error = authenticate(headers)
+    if auth_error:
+        return auth_error
+    idempotency_key = headers.get('idempotency-key') or headers.get('Idempotency-Key')
     path = event.get('queryStringParameters', {}).get('path', '')
     
     try:
@@ -57,6 +397,12 @@ def handler(event: dict, context) -> dict:
                 result = get_chat_messages(conn, business_id)
             elif path == 'advertisement':
                 result = get_active_advertisement(conn)
+            elif path == 'chat-archive':
+                query = event.get('queryStringParameters', {})
+                result = get_chat_archive(conn, query.get('business_id'), query.get('before'))
+            elif path == 'owner-summary':
+                months = event.get('queryStringParameters', {}).get('months')
+                result = get_owner_summary(conn, user_id, months)
             else:
                 result = {'error': 'Invalid path'}
         
@@ -66,13 +412,25 @@ def handler(event: dict, context) -> dict:
             if path == 'business':
                 result = create_business(conn, user_id, body)
             elif path == 'transaction':
-                result = create_transaction(conn, user_id, body)
+                result, conflict = run_idempotent(
+                    conn, user_id, idempotency_key, path, body,
+                    lambda: create_transaction(conn, user_id, body, commit=False)
+                )
+                if conflict:
+                    return conflict
+            elif path == 'transactions/bulk':
+                result = create_transactions_bulk(conn, user_id, body)
             elif path == 'note':
                 result = create_or_update_note(conn, user_id, body)
             elif path == 'join-business':
                 result = join_business(conn, user_id, body)
             elif path == 'chat':
-                result = send_chat_message(conn, user_id, body)
+                result, conflict = run_idempotent(
+                    conn, user_id, idempotency_key, path, body,
+                    lambda: send_chat_message(conn, user_id, body, commit=False)
+                )
+                if conflict:
+                    return conflict
             else:
                 result = {'error': 'Invalid path'}
         
@@ -83,25 +441,20 @@ def handler(event: dict, context) -> dict:
                 result = update_business(conn, user_id, body)
             elif path == 'archive-business':
                 result = archive_business(conn, user_id, body)
+            elif path == 'chat-retention':
+                result = set_chat_retention(conn, user_id, body)
             else:
                 result = {'error': 'Invalid path'}
         
         else:
             result = {'error': 'Method not allowed'}
         
-        conn.close()
+        conn.rollback()
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(result, ensure_ascii=False, default=str),
-            'isBase64Encoded': False
-        }
+        return json_response(result)
     
     except Exception as e:
+        reset_db_connection()
         return {
             'statusCode': 500,
             'headers': {
@@ -118,19 +471,7 @@ def get_user_businesses(conn, user_id):
         return {'error': 'User ID required'}
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT DISTINCT b.*, 
-                CASE WHEN b.user_id = %s THEN 'owner' ELSE bm.role END as my_role,
-                COUNT(DISTINCT t.id) as transaction_count,
-                COALESCE(SUM(CASE WHEN t.type = 'income' THEN t.amount ELSE -t.amount END), 0) as balance
-            FROM businesses b
-            LEFT JOIN business_members bm ON b.id = bm.business_id AND bm.user_id = %s
-            LEFT JOIN transactions t ON b.id = t.business_id
-            WHERE (b.user_id = %s OR bm.user_id = %s) AND b.is_archived = FALSE
-            GROUP BY b.id, bm.role
-            ORDER BY b.created_at DESC
-            LIMIT 20
-        """, (user_id, user_id, user_id, user_id))
+        cur.execute(USER_BUSINESSES_SQL, (user_id, user_id))
         businesses = cur.fetchall()
         conn.commit()
         return {'businesses': businesses}
@@ -138,33 +479,16 @@ def get_user_businesses(conn, user_id):
 def get_business_details(conn, business_id, user_id):
     """Получить детальную информацию о бизнесе"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT b.*, 
-                COUNT(DISTINCT bm.id) as member_count,
-                COALESCE(SUM(CASE WHEN t.type = 'income' THEN t.amount ELSE -t.amount END), 0) as balance
-            FROM businesses b
-            LEFT JOIN business_members bm ON b.id = bm.business_id
-            LEFT JOIN transactions t ON b.id = t.business_id
-            WHERE b.id = %s
-            GROUP BY b.id
-        """, (business_id,))
+        cur.execute(BUSINESS_DETAILS_SQL, (business_id,))
         business = cur.fetchone()
         
         if not business:
             return {'error': 'Business not found'}
         
-        cur.execute("""
-            SELECT u.id, u.username, u.avatar_url, u.is_premium, bm.role
-            FROM business_members bm
-            JOIN users u ON bm.user_id = u.id
-            WHERE bm.business_id = %s
-            ORDER BY bm.joined_at ASC
-        """, (business_id,))
-        members = cur.fetchall()
+        cur.execute(BUSINESS_MEMBERS_SQL, (business_id,))
+        members = attach_user_summaries(conn, cur.fetchall(), key='id')
         
-        cur.execute("""
-            SELECT * FROM business_notes WHERE business_id = %s ORDER BY updated_at DESC LIMIT 1
-        """, (business_id,))
+        cur.execute(BUSINESS_NOTE_SQL, (business_id,))
         note = cur.fetchone()
         
         conn.commit()
@@ -262,16 +586,30 @@ def archive_business(conn, user_id, body):
             return {'success': True}
         return {'error': 'Business not found or access denied'}
 
-def create_transaction(conn, user_id, body):
+def create_transaction(conn, user_id, body, commit=True):
     """Создать транзакцию"""
     if not user_id:
         return {'error': 'User ID required'}
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
-            INSERT INTO transactions (business_id, type, amount, category, description, created_by)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id, created_at
+            WITH inserted AS (
+                INSERT INTO transactions (business_id, type, amount, category, description, created_by)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id, created_at, business_id, date, type, amount, category
+            ), rolled_up AS (
+                INSERT INTO business_monthly_rollups (business_id, month, category, income, expense, transaction_count)
+                SELECT business_id, date_trunc('month', date)::date, category,
+                       CASE WHEN type = 'income' THEN amount ELSE 0 END,
+                       CASE WHEN type = 'expense' THEN amount ELSE 0 END,
+                       1
+                FROM inserted
+                ON CONFLICT (business_id, month, category) DO UPDATE SET
+                    income = business_monthly_rollups.income + EXCLUDED.income,
+                    expense = business_monthly_rollups.expense + EXCLUDED.expense,
+                    transaction_count = business_monthly_rollups.transaction_count + 1
+            )
+            SELECT id, created_at FROM inserted
         """, (
             body['business_id'],
             body['type'],
@@ -281,21 +619,105 @@ def create_transaction(conn, user_id, body):
             user_id
         ))
         result = cur.fetchone()
-        conn.commit()
+        if commit:
+            conn.commit()
         return {'success': True, 'transaction_id': result['id']}
 
+def create_transactions_bulk(conn, user_id, body):
+    """Массовая загрузка транзакций с обновлением помесячных итогов одним запросом"""
+    if not user_id:
+        return {'error': 'User ID required'}
+    
+    transactions = body.get('transactions') or []
+    if not transactions:
+        return {'error': 'No transactions provided'}
+    if len(transactions) > BULK_TRANSACTIONS_MAX:
+        return {'error': f'Не более {BULK_TRANSACTIONS_MAX} транзакций за запрос'}
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            WITH inserted AS (
+                INSERT INTO transactions (business_id, type, amount, category, description, date, created_by)
+                SELECT %s, t.type, t.amount, t.category, COALESCE(t.description, ''),
+                       COALESCE(t.date, CURRENT_TIMESTAMP), %s
+                FROM jsonb_to_recordset(%s::jsonb)
+                    AS t(type VARCHAR, amount DECIMAL, category VARCHAR, description TEXT, date TIMESTAMP)
+                RETURNING business_id, date, type, amount, category
+            ), rolled_up AS (
+                INSERT INTO business_monthly_rollups (business_id, month, category, income, expense, transaction_count)
+                SELECT business_id, date_trunc('month', date)::date, category,
+                       COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0),
+                       COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0),
+                       COUNT(*)
+                FROM inserted
+                GROUP BY 1, 2, 3
+                ON CONFLICT (business_id, month, category) DO UPDATE SET
+                    income = business_monthly_rollups.income + EXCLUDED.income,
+                    expense = business_monthly_rollups.expense + EXCLUDED.expense,
+                    transaction_count = business_monthly_rollups.transaction_count + EXCLUDED.transaction_count
+            )
+            SELECT COUNT(*) as inserted FROM inserted
+        """, (body['business_id'], user_id, json.dumps(transactions)))
+        result = cur.fetchone()
+        conn.commit()
+        return {'success': True, 'inserted': result['inserted']}
+
+def get_owner_summary(conn, user_id, months):
+    """Итоги по всем бизнесам владельца: по месяцам и категориям из помесячных итогов"""
+    if not user_id:
+        return {'error': 'User ID required'}
+    
+    months = int(months) if months and str(months).isdigit() else OWNER_SUMMARY_MONTHS
+    months = min(max(months, 1), OWNER_SUMMARY_MAX_MONTHS)
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT r.month, r.category,
+                SUM(r.income) as income,
+                SUM(r.expense) as expense,
+                SUM(r.transaction_count) as transaction_count
+            FROM businesses b
+            JOIN business_monthly_rollups r ON r.business_id = b.id
+            WHERE b.user_id = %s AND b.is_archived = FALSE
+              AND r.month >= (date_trunc('month', CURRENT_DATE) - make_interval(months => %s))::date
+            GROUP BY r.month, r.category
+            ORDER BY r.month DESC, r.category
+        """, (user_id, months - 1))
+        rows = cur.fetchall()
+        conn.commit()
+    
+    by_month = {}
+    for row in rows:
+        month = by_month.setdefault(row['month'], {
+            'month': row['month'], 'income': 0, 'expense': 0, 'transaction_count': 0, 'categories': []
+        })
+        month['income'] += row['income']
+        month['expense'] += row['expense']
+        month['transaction_count'] += row['transaction_count']
+        month['categories'].append({
+            'category': row['category'],
+            'income': row['income'],
+            'expense': row['expense'],
+            'balance': row['income'] - row['expense'],
+            'transaction_count': row['transaction_count']
+        })
+    
+    summary = list(by_month.values())
+    for month in summary:
+        month['balance'] = month['income'] - month['expense']
+    
+    return {
+        'months': summary,
+        'income': sum(month['income'] for month in summary),
+        'expense': sum(month['expense'] for month in summary),
+        'balance': sum(month['balance'] for month in summary)
+    }
+
 def get_transactions(conn, business_id):
     """Получить транзакции бизнеса"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT t.*, u.username
-            FROM transactions t
-            LEFT JOIN users u ON t.created_by = u.id
-            WHERE t.business_id = %s
-            ORDER BY t.date DESC
-            LIMIT 500
-        """, (business_id,))
-        transactions = cur.fetchall()
+        cur.execute(TRANSACTIONS_SQL, (business_id,))
+        transactions = attach_user_summaries(conn, cur.fetchall(), key='created_by', fields=('username',))
         conn.commit()
         return {'transactions': transactions}
 
@@ -357,7 +779,7 @@ def join_business(conn, user_id, body):
             return {'success': True, 'business_id': business['id'], 'business_name': business['name']}
         return {'error': 'Вы уже участник этого бизнеса'}
 
-def send_chat_message(conn, user_id, body):
+def send_chat_message(conn, user_id, body, commit=True):
     """Отправить сообщение в чат онлайн-бизнеса"""
     if not user_id:
         return {'error': 'User ID required'}
@@ -369,34 +791,116 @@ def send_chat_message(conn, user_id, body):
             RETURNING id, created_at
         """, (body['business_id'], user_id, body['message']))
         result = cur.fetchone()
-        conn.commit()
+        if commit:
+            conn.commit()
         return {'success': True, 'message_id': result['id'], 'created_at': result['created_at']}
 
 def get_chat_messages(conn, business_id):
     """Получить сообщения чата"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT bc.*, u.username, u.avatar_url, u.is_premium
-            FROM business_chat bc
-            JOIN users u ON bc.user_id = u.id
-            WHERE bc.business_id = %s
-            ORDER BY bc.created_at ASC
-            LIMIT 500
-        """, (business_id,))
-        messages = cur.fetchall()
+        cur.execute(CHAT_MESSAGES_SQL, (business_id,))
+        messages = attach_user_summaries(conn, cur.fetchall())
         conn.commit()
         return {'messages': messages}
 
-def get_active_advertisement(conn):
-    """Получить активную рекламу"""
+def set_chat_retention(conn, user_id, body):
+    """Задать срок хранения сообщений чата в днях (null — срок по умолчанию)"""
+    if not user_id:
+        return {'error': 'User ID required'}
+    
+    retention_days = body.get('retention_days')
+    if retention_days is not None:
+        retention_days = int(retention_days)
+        if not 1 <= retention_days <= CHAT_RETENTION_MAX_DAYS:
+            return {'error': f'retention_days must be between 1 and {CHAT_RETENTION_MAX_DAYS}'}
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
-            SELECT id, title, content, image_url, created_at
-            FROM advertisements
-            WHERE is_active = TRUE
-            ORDER BY created_at DESC
+            UPDATE businesses
+            SET chat_retention_days = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND user_id = %s
+            RETURNING id
+        """, (retention_days, body.get('business_id'), user_id))
+        result = cur.fetchone()
+        conn.commit()
+        
+        if result:
+            return {'success': True, 'retention_days': retention_days or CHAT_RETENTION_DAYS}
+        return {'error': 'Business not found or access denied'}
+
+def archive_chat_batch(conn, business_id, retention_days=None, batch_size=CHAT_ARCHIVE_BATCH):
+    """Перенести пачку сообщений чата старше срока хранения в архив (gzip NDJSON); вернуть их число"""
+    import gzip
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Удаление и запись архива в одной транзакции: параллельные запуски не архивируют сообщения дважды
+        cur.execute("""
+            DELETE FROM business_chat
+            WHERE business_id = %s AND id IN (
+                SELECT id FROM business_chat
+                WHERE business_id = %s
+                  AND created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                ORDER BY id ASC
+                LIMIT %s
+            )
+            RETURNING id, user_id, message, created_at
+        """, (business_id, business_id, retention_days or CHAT_RETENTION_DAYS, batch_size))
+        messages = sorted(cur.fetchall(), key=lambda message: message['id'])
+        if not messages:
+            conn.commit()
+            return 0
+        
+        payload = '\n'.join(json.dumps(message, ensure_ascii=False, default=str) for message in messages)
+        cur.execute("""
+            INSERT INTO business_chat_archives
+                (business_id, first_message_id, last_message_id, first_created_at, last_created_at, message_count, payload)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (
+            business_id, messages[0]['id'], messages[-1]['id'],
+            messages[0]['created_at'], messages[-1]['created_at'], len(messages),
+            psycopg2.Binary(gzip.compress(payload.encode()))
+        ))
+        conn.commit()
+        return len(messages)
+
+def get_chat_archive(conn, business_id, before=None):
+    """Одна пачка архива чата, от новых к старым; next_before — курсор следующей пачки"""
+    import gzip
+    
+    if not business_id or not str(business_id).isdigit():
+        return {'error': 'Invalid business_id'}
+    if before and not str(before).isdigit():
+        return {'error': 'Invalid cursor'}
+    before = int(before) if before else None
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT a.id, a.payload,
+                EXISTS(SELECT 1 FROM business_chat_archives o WHERE o.business_id = a.business_id AND o.id < a.id) as has_more
+            FROM business_chat_archives a
+            WHERE a.business_id = %s AND (%s IS NULL OR a.id < %s)
+            ORDER BY a.id DESC
             LIMIT 1
-        """)
+        """, (business_id, before, before))
+        archive = cur.fetchone()
+        conn.commit()
+    
+    if not archive:
+        return {'messages': [], 'next_before': None}
+    
+    messages = [json.loads(line) for line in gzip.decompress(bytes(archive['payload'])).decode().split('\n')]
+    for message in messages:
+        message['business_id'] = int(business_id)
+    
+    return {
+        'messages': attach_user_summaries(conn, messages),
+        'next_before': archive['id'] if archive['has_more'] else None
+    }
+
+def get_active_advertisement(conn):
+    """Получить активную рекламу"""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(ACTIVE_ADVERTISEMENT_SQL)
         ad = cur.fetchone()
         conn.commit()
         return {'advertisement': ad}
\ No newline at end of file
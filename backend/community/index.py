@@ -3,13 +3,224 @@ API для управления вопросами, ответами и лайк
 """
 import json
 import os
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime
+
+USER_CACHE_TTL = 30
+USER_CACHE_MAX_SIZE = 10000
+_user_cache = {}
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+IDEMPOTENCY_SWEEP_INTERVAL = 300
+IDEMPOTENCY_SWEEP_BATCH = 500
+_idempotency_swept_at = 0.0
+# Вход по X-User-Id без токена сессии оставлен для текущего клиента (src/lib/api.ts), который
+# не передаёт X-Session-Token. Блокировка и срок подписки проверяются только по токену, поэтому
+# после перехода клиента на токены флаг выключается (ALLOW_LEGACY_USER_ID=0), а ветка удаляется.
+ALLOW_LEGACY_USER_ID = os.environ.get('ALLOW_LEGACY_USER_ID', '1') == '1'
+DB_CONNECTION_MAX_IDLE = 60
+_conn = None
+_conn_used_at = 0.0
 
 def get_db_connection():
-    """Создание подключения к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Подключение к БД: тёплый экземпляр функции переиспользует соединение"""
+    global _conn, _conn_used_at
+    
+    now = time.monotonic()
+    if _conn is not None and (_conn.closed or now - _conn_used_at > DB_CONNECTION_MAX_IDLE):
+        reset_db_connection()
+    if _conn is None:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    _conn_used_at = now
+    return _conn
+
+def reset_db_connection():
+    """Закрыть соединение, чтобы следующий вызов открыл новое"""
+    global _conn
+    
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+# Прогрев соединения при загрузке модуля (холодный старт), а не в первом запросе
+if os.environ.get('DATABASE_URL'):
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        _conn = None
+
+# hmac, hashlib и base64 импортируются по месту: они нужны только запросам с токеном
+# или Idempotency-Key, а на холодном старте это самые тяжёлые импорты модуля
+def _b64encode(data: bytes) -> str:
+    import base64
+    
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    import base64
+    
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def verify_session_token(token):
+    """Проверка подписанного токена сессии без обращения к БД"""
+    import hashlib
+    import hmac
+    
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret or '.' not in token:
+        return None
+    
+    body, signature = token.rsplit('.', 1)
+    expected = _b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
+        return None
+    
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    
+    if claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+def error_response(status_code: int, message: str) -> dict:
+    """Ответ с ошибкой и заданным HTTP-статусом"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def load_user_summaries(conn, user_ids):
+    """Загрузить краткие профили пользователей одним запросом (с кешем)"""
+    now = time.monotonic()
+    summaries = {}
+    missing = []
+    
+    for user_id in {uid for uid in user_ids if uid is not None}:
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > now:
+            summaries[user_id] = cached[1]
+        else:
+            missing.append(user_id)
+    
+    if missing:
+        if len(_user_cache) > USER_CACHE_MAX_SIZE:
+            _user_cache.clear()
+        
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, username, avatar_url, is_premium
+                FROM users
+                WHERE id = ANY(%s)
+            """, (missing,))
+            for user in cur.fetchall():
+                summary = dict(user)
+                _user_cache[summary['id']] = (now + USER_CACHE_TTL, summary)
+                summaries[summary['id']] = summary
+    
+    return summaries
+
+def attach_user_summaries(conn, rows, key='user_id', fields=('username', 'avatar_url', 'is_premium')):
+    """Добавить к строкам поля профиля автора"""
+    summaries = load_user_summaries(conn, [row[key] for row in rows])
+    for row in rows:
+        summary = summaries.get(row[key], {})
+        for field in fields:
+            row[field] = summary.get(field)
+    return rows
+
+def invalidate_user_summary(user_id):
+    """Сбросить кеш профиля пользователя"""
+    _user_cache.pop(user_id, None)
+
+def run_idempotent(conn, user_id, idempotency_key, endpoint, body, write):
+    """Выполнить запись не более одного раза на ключ Idempotency-Key: (результат, ответ-ошибка или None)"""
+    if not idempotency_key or not user_id:
+        result = write()
+        conn.commit()
+        return result, None
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, error_response(400, 'Idempotency-Key слишком длинный')
+    
+    import hashlib
+    
+    request_hash = hashlib.sha256(
+        json.dumps([endpoint, body], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Параллельный дубль ждёт на этой вставке, пока первый запрос не завершит транзакцию
+        cur.execute("""
+            INSERT INTO idempotency_keys (user_id, idempotency_key, endpoint, request_hash, expires_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+            ON CONFLICT (user_id, idempotency_key) DO UPDATE SET
+                endpoint = EXCLUDED.endpoint,
+                request_hash = EXCLUDED.request_hash,
+                response = NULL,
+                created_at = CURRENT_TIMESTAMP,
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+            RETURNING user_id
+        """, (user_id, idempotency_key, endpoint, request_hash, IDEMPOTENCY_TTL_HOURS))
+        
+        if not cur.fetchone():
+            cur.execute("""
+                SELECT request_hash, response FROM idempotency_keys
+                WHERE user_id = %s AND idempotency_key = %s
+            """, (user_id, idempotency_key))
+            stored = cur.fetchone()
+            conn.commit()
+            
+            if stored['request_hash'] != request_hash:
+                return None, error_response(409, 'Idempotency-Key уже использован для другого запроса')
+            if stored['response'] is None:
+                return None, error_response(409, 'Запрос с этим Idempotency-Key ещё выполняется')
+            return stored['response'], None
+        
+        # Ключ, запись и ответ фиксируются одним commit: повтор получает сохранённый ответ,
+        # а если запись откатилась, ключ освобождается вместе с ней
+        result = write()
+        cur.execute("""
+            UPDATE idempotency_keys SET response = %s
+            WHERE user_id = %s AND idempotency_key = %s
+        """, (json.dumps(result, ensure_ascii=False, default=str), user_id, idempotency_key))
+        conn.commit()
+    
+    sweep_idempotency_keys(conn)
+    return result, None
+
+def sweep_idempotency_keys(conn):
+    """Удалить пачку просроченных ключей не чаще раза в IDEMPOTENCY_SWEEP_INTERVAL (отдельной транзакцией)"""
+    global _idempotency_swept_at
+    
+    if time.monotonic() - _idempotency_swept_at < IDEMPOTENCY_SWEEP_INTERVAL:
+        return
+    _idempotency_swept_at = time.monotonic()
+    
+    # Срок проверяется повторно на самой строке: ключ могли заново занять после выборки,
+    # а SKIP LOCKED не ждёт строки, которые держат параллельные запросы
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM idempotency_keys
+                WHERE (user_id, idempotency_key) IN (
+                    SELECT user_id, idempotency_key FROM idempotency_keys
+                    WHERE expires_at < CURRENT_TIMESTAMP
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) AND expires_at < CURRENT_TIMESTAMP
+            """, (IDEMPOTENCY_SWEEP_BATCH,))
+            conn.commit()
+    except psycopg2.Error:
+        # Запись пользователя уже зафиксирована: сбой очистки не должен превращаться в 500
+        conn.rollback()
 
 def handler(event: dict, context) -> dict:
     """Обработчик API запросов для сообщества"""
@@ -21,7 +232,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -29,8 +240,23 @@ def handler(event: dict, context) -> dict:
         }
     
     headers = event.get('headers', {})
-    user_id_str = headers.get('x-user-id') or headers.get('X-User-Id')
-    user_id = int(user_id_str) if user_id_str else None
+    session_token = headers.get('x-session-token') or headers.get('X-Session-Token')
+    
+    if session_token:
+        session = verify_session_token(session_token)
+        if not session:
+            return error_response(401, 'Сессия недействительна')
+        if session['blk']:
+            return error_response(403, 'Аккаунт заблокирован')
+        if session['sub'] and time.time() > session['sub']:
+            return error_response(403, 'Подписка истекла')
+        user_id = session['uid']
+    else:
+        user_id_str = headers.get('x-user-id') or headers.get('X-User-Id')
+        if user_id_str and (not ALLOW_LEGACY_USER_ID or not user_id_str.isdigit()):
+            return error_response(401, 'Требуется токен сессии')
+        user_id = int(user_id_str) if user_id_str else None
+    idempotency_key = headers.get('idempotency-key') or headers.get('Idempotency-Key')
     path = event.get('queryStringParameters', {}).get('path', '')
     
     try:
@@ -49,9 +275,19 @@ def handler(event: dict, context) -> dict:
             body = json.loads(event.get('body', '{}'))
             
             if path == 'question':
-                result = create_question(conn, user_id, body)
+                result, conflict = run_idempotent(
+                    conn, user_id, idempotency_key, path, body,
+                    lambda: create_question(conn, user_id, body, commit=False)
+                )
+                if conflict:
+                    return conflict
             elif path == 'answer':
-                result = create_answer(conn, user_id, body)
+                result, conflict = run_idempotent(
+                    conn, user_id, idempotency_key, path, body,
+                    lambda: create_answer(conn, user_id, body, commit=False)
+                )
+                if conflict:
+                    return conflict
             elif path == 'like':
                 result = toggle_like(conn, user_id, body)
             elif path == 'user':
@@ -62,7 +298,7 @@ def handler(event: dict, context) -> dict:
         else:
             result = {'error': 'Method not allowed'}
         
-        conn.close()
+        conn.rollback()
         
         return {
             'statusCode': 200,
@@ -75,6 +311,7 @@ def handler(event: dict, context) -> dict:
         }
     
     except Exception as e:
+        reset_db_connection()
         return {
             'statusCode': 500,
             'headers': {
@@ -90,16 +327,15 @@ def get_questions(conn):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
             SELECT 
-                q.id, q.title, q.content, q.category, q.created_at,
-                u.id as user_id, u.username, u.avatar_url, u.is_premium,
+                q.id, q.title, q.content, q.category, q.created_at, q.user_id,
                 COUNT(DISTINCT a.id) as answer_count
             FROM questions q
-            LEFT JOIN users u ON q.user_id = u.id
             LEFT JOIN answers a ON q.id = a.question_id
-            GROUP BY q.id, u.id
+            GROUP BY q.id
             ORDER BY q.created_at DESC
         """)
         questions = cur.fetchall()
+        attach_user_summaries(conn, questions)
         conn.commit()
         return {'questions': questions}
 
@@ -107,11 +343,8 @@ def get_question_with_answers(conn, question_id):
     """Получить вопрос со всеми ответами и лайками"""
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
-            SELECT 
-                q.id, q.title, q.content, q.category, q.created_at,
-                u.id as user_id, u.username, u.avatar_url, u.is_premium
+            SELECT q.id, q.title, q.content, q.category, q.created_at, q.user_id
             FROM questions q
-            LEFT JOIN users u ON q.user_id = u.id
             WHERE q.id = %s
         """, (question_id,))
         question = cur.fetchone()
@@ -121,14 +354,12 @@ def get_question_with_answers(conn, question_id):
         
         cur.execute("""
             SELECT 
-                a.id, a.content, a.created_at,
-                u.id as user_id, u.username, u.avatar_url, u.is_premium,
+                a.id, a.content, a.created_at, a.user_id,
                 COUNT(DISTINCT al.id) as like_count
             FROM answers a
-            LEFT JOIN users u ON a.user_id = u.id
             LEFT JOIN answer_likes al ON a.id = al.answer_id
             WHERE a.question_id = %s
-            GROUP BY a.id, u.id
+            GROUP BY a.id
             ORDER BY like_count DESC, a.created_at ASC
         """, (question_id,))
         answers = cur.fetchall()
@@ -139,11 +370,12 @@ def get_question_with_answers(conn, question_id):
             """, (answer['id'],))
             answer['liked_by'] = [row[0] for row in cur.fetchall()]
         
+        attach_user_summaries(conn, [question] + answers)
         conn.commit()
         question['answers'] = answers
         return question
 
-def create_question(conn, user_id, body):
+def create_question(conn, user_id, body, commit=True):
     """Создать новый вопрос"""
     if not user_id:
         return {'error': 'User ID required'}
@@ -155,10 +387,11 @@ def create_question(conn, user_id, body):
             RETURNING id, created_at
         """, (user_id, body['title'], body['content'], body['category']))
         result = cur.fetchone()
-        conn.commit()
+        if commit:
+            conn.commit()
         return {'success': True, 'question_id': result['id'], 'created_at': result['created_at']}
 
-def create_answer(conn, user_id, body):
+def create_answer(conn, user_id, body, commit=True):
     """Создать новый ответ"""
     if not user_id:
         return {'error': 'User ID required'}
@@ -170,7 +403,8 @@ def create_answer(conn, user_id, body):
             RETURNING id, created_at
         """, (body['question_id'], user_id, body['content']))
         result = cur.fetchone()
-        conn.commit()
+        if commit:
+            conn.commit()
         return {'success': True, 'answer_id': result['id'], 'created_at': result['created_at']}
 
 def toggle_like(conn, user_id, body):
@@ -227,4 +461,5 @@ def create_or_update_user(conn, body):
         ))
         result = cur.fetchone()
         conn.commit()
+        invalidate_user_summary(result['id'])
         return {'success': True, 'user_id': result['id']}
\ No newline at end of file
@@ -0,0 +1,4 @@
+CREATE TABLE session_revocations (
+    user_id INTEGER PRIMARY KEY,
+    revoked_before TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,26 @@
+CREATE TABLE sessions (
+    id SERIAL PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL,
+    user_id INTEGER NOT NULL,
+    device VARCHAR(255),
+    ip_address VARCHAR(45),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE UNIQUE INDEX idx_sessions_token_hash ON sessions(token_hash);
+CREATE INDEX idx_sessions_user_id ON sessions(user_id);
+CREATE INDEX idx_sessions_expires_at ON sessions(expires_at);
+
+-- Перенос существующих токенов 'Запомнить меня' (хранятся только хеши)
+INSERT INTO sessions (token_hash, user_id, ip_address, expires_at)
+SELECT encode(sha256(convert_to(remember_token, 'UTF8')), 'hex'), id, ip_address,
+       CURRENT_TIMESTAMP + INTERVAL '30 days'
+FROM users
+WHERE remember_token IS NOT NULL
+ON CONFLICT (token_hash) DO NOTHING;
+
+-- Открытые токены больше не нужны: сессии ищутся по хешу
+DROP INDEX IF EXISTS idx_users_remember_token;
+ALTER TABLE users DROP COLUMN IF EXISTS remember_token;
@@ -0,0 +1,13 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Поиск по подстроке (от 3 символов) в админке
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (email gin_trgm_ops);
+
+-- Поиск по префиксу для коротких запросов
+CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users (lower(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_lower ON users (lower(email) text_pattern_ops);
+
+-- Keyset-пагинация и фильтр по окончанию подписки
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_subscription_ends_at ON users (subscription_ends_at);
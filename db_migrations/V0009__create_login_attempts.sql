@@ -0,0 +1,9 @@
+-- Общие счётчики попыток входа по окнам (UNLOGGED: данные не критичны, WAL не пишется)
+CREATE UNLOGGED TABLE login_attempts (
+    key VARCHAR(320) NOT NULL,
+    window_start TIMESTAMP NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window_start)
+);
+
+CREATE INDEX idx_login_attempts_window_start ON login_attempts(window_start);
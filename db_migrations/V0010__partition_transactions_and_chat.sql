@@ -0,0 +1,106 @@
+-- Помесячное секционирование transactions (по date) и business_chat (по created_at)
+
+CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := parent || '_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, month_start, (month_start + INTERVAL '1 month')::date
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- transactions
+
+ALTER TABLE transactions RENAME TO transactions_legacy;
+DROP INDEX IF EXISTS idx_transactions_business_id;
+DROP INDEX IF EXISTS idx_transactions_date;
+
+CREATE TABLE transactions (
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+    business_id INTEGER NOT NULL,
+    type VARCHAR(20) NOT NULL CHECK (type IN ('income', 'expense')),
+    amount DECIMAL(15, 2) NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    description TEXT,
+    date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(
+                (SELECT MIN(COALESCE(date, created_at)) FROM transactions_legacy),
+                CURRENT_TIMESTAMP
+            )),
+            date_trunc('month', CURRENT_TIMESTAMP + INTERVAL '3 months'),
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        PERFORM create_monthly_partition('transactions', month_start);
+    END LOOP;
+END $$;
+
+INSERT INTO transactions (id, business_id, type, amount, category, description, date, created_by, created_at)
+SELECT id, business_id, type, amount, category, description,
+       COALESCE(date, created_at, CURRENT_TIMESTAMP), created_by, created_at
+FROM transactions_legacy;
+
+ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+DROP TABLE transactions_legacy;
+
+CREATE INDEX idx_transactions_business_date ON transactions (business_id, date DESC);
+
+-- business_chat
+
+ALTER TABLE business_chat RENAME TO business_chat_legacy;
+DROP INDEX IF EXISTS idx_business_chat_business_id;
+
+CREATE TABLE business_chat (
+    id INTEGER NOT NULL DEFAULT nextval('business_chat_id_seq'),
+    business_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE business_chat_default PARTITION OF business_chat DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(
+                (SELECT MIN(created_at) FROM business_chat_legacy),
+                CURRENT_TIMESTAMP
+            )),
+            date_trunc('month', CURRENT_TIMESTAMP + INTERVAL '3 months'),
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        PERFORM create_monthly_partition('business_chat', month_start);
+    END LOOP;
+END $$;
+
+INSERT INTO business_chat (id, business_id, user_id, message, created_at)
+SELECT id, business_id, user_id, message, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM business_chat_legacy;
+
+ALTER SEQUENCE business_chat_id_seq OWNED BY business_chat.id;
+DROP TABLE business_chat_legacy;
+
+CREATE INDEX idx_business_chat_business_id_id ON business_chat (business_id, id);
@@ -0,0 +1,20 @@
+-- Помесячные итоги по бизнесу и категории: обновляются вместе с вставкой транзакций
+CREATE TABLE business_monthly_rollups (
+    business_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    income DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    expense DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (business_id, month, category)
+);
+
+INSERT INTO business_monthly_rollups (business_id, month, category, income, expense, transaction_count)
+SELECT business_id,
+       date_trunc('month', date)::date,
+       category,
+       COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0),
+       COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0),
+       COUNT(*)
+FROM transactions
+GROUP BY 1, 2, 3;
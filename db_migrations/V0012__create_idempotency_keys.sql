@@ -0,0 +1,13 @@
+-- Ключи Idempotency-Key для повторов запросов записи (хранятся сутки)
+CREATE TABLE idempotency_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    endpoint VARCHAR(50) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    response JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
@@ -0,0 +1,17 @@
+-- Срок хранения сообщений чата в днях (NULL — значение по умолчанию функции)
+ALTER TABLE businesses ADD COLUMN IF NOT EXISTS chat_retention_days INTEGER;
+
+-- Архив чата: пачки старых сообщений в виде gzip NDJSON
+CREATE TABLE business_chat_archives (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER NOT NULL,
+    first_message_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    first_created_at TIMESTAMP NOT NULL,
+    last_created_at TIMESTAMP NOT NULL,
+    message_count INTEGER NOT NULL,
+    payload BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_business_chat_archives_business_id ON business_chat_archives (business_id, id DESC);
@@ -0,0 +1,9 @@
+-- Токены сессии, отозванные выходом на одном устройстве (по sid из токена);
+-- строка нужна, пока токен ещё можно обновить
+CREATE TABLE revoked_session_ids (
+    sid VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX idx_revoked_session_ids_expires_at ON revoked_session_ids(expires_at);
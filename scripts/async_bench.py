@@ -0,0 +1,104 @@
+"""
+Сравнение синхронного handler() и асинхронного режима (asgi.async_handler) функции businesses.
+Сначала проверяется, что ответы обоих режимов совпадают, затем замеряются
+пропускная способность и задержки на одинаковом наборе запросов чтения.
+
+Пример:
+    DATABASE_URL=... python scripts/async_bench.py --user-id 1 --business-id 1 --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'businesses'))
+
+import index  # noqa: E402
+import asgi  # noqa: E402
+
+def build_events(user_id: int, business_id: int):
+    """Запросы чтения, которые обслуживают оба режима"""
+    headers = {'X-User-Id': str(user_id)}
+    queries = [
+        {'path': 'businesses'},
+        {'path': f'business/{business_id}'},
+        {'path': 'transactions', 'business_id': str(business_id)},
+        {'path': 'chat', 'business_id': str(business_id)},
+        {'path': 'advertisement'}
+    ]
+    return [{'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': query} for query in queries]
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль выборки без интерполяции"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(mode: str, latencies, elapsed: float):
+    """Строка отчёта по режиму"""
+    print(f"{mode:<6} {len(latencies) / elapsed:8.1f} запр/с   "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} мс   "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.1f} мс")
+
+async def check_parity(events) -> bool:
+    """Ответы синхронного и асинхронного режимов должны совпадать"""
+    identical = True
+    for event in events:
+        sync_response = index.handler(event, None)
+        async_response = await asgi.async_handler(event)
+        same = (sync_response['statusCode'] == async_response['statusCode']
+                and json.loads(sync_response['body']) == json.loads(async_response['body']))
+        identical = identical and same
+        print(f"{'OK  ' if same else 'DIFF'} {event['queryStringParameters']['path']}")
+    return identical
+
+def run_sync(events, total: int):
+    """Синхронный режим: один запрос в процессе за раз"""
+    index._user_cache.clear()
+    latencies = []
+    started = time.perf_counter()
+    for number in range(total):
+        request_started = time.perf_counter()
+        index.handler(events[number % len(events)], None)
+        latencies.append(time.perf_counter() - request_started)
+    return latencies, time.perf_counter() - started
+
+async def run_async(events, total: int, concurrency: int):
+    """Асинхронный режим: до concurrency запросов одновременно в одном процессе"""
+    index._user_cache.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async def one(event):
+        async with semaphore:
+            request_started = time.perf_counter()
+            await asgi.async_handler(event)
+            latencies.append(time.perf_counter() - request_started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(events[number % len(events)]) for number in range(total)))
+    return latencies, time.perf_counter() - started
+
+async def main_async(args) -> int:
+    events = build_events(args.user_id, args.business_id)
+    if not await check_parity(events):
+        print('Ответы режимов различаются')
+        return 1
+    
+    report('sync', *run_sync(events, args.requests))
+    report('async', *await run_async(events, args.requests, args.concurrency))
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Сравнение синхронного и асинхронного режимов businesses')
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--business-id', type=int, required=True)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args(argv)
+    return asyncio.run(main_async(args))
+
+if __name__ == '__main__':
+    sys.exit(main())
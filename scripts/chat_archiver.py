@@ -0,0 +1,61 @@
+"""
+Архивация чата онлайн-бизнесов: сообщения старше срока хранения бизнеса
+(businesses.chat_retention_days, по умолчанию CHAT_RETENTION_DAYS) пачками переносятся
+из business_chat в business_chat_archives. Запускается по расписанию, например раз в сутки.
+
+Пример:
+    DATABASE_URL=... python scripts/chat_archiver.py --batch-size 1000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'businesses'))
+
+import index  # noqa: E402
+
+def online_businesses(conn):
+    """Онлайн-бизнесы (только у них есть чат) и их сроки хранения"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, chat_retention_days FROM businesses WHERE is_online = TRUE ORDER BY id")
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+def archive_business_chat(conn, business_id: int, retention_days, batch_size: int, max_batches: int) -> int:
+    """Архивировать чат одного бизнеса пачками; вернуть число перенесённых сообщений"""
+    archived = 0
+    for _ in range(max_batches):
+        count = index.archive_chat_batch(conn, business_id, retention_days, batch_size)
+        archived += count
+        if count < batch_size:
+            break
+    return archived
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Архивация старых сообщений чата бизнесов')
+    parser.add_argument('--batch-size', type=int, default=index.CHAT_ARCHIVE_BATCH)
+    parser.add_argument('--max-batches', type=int, default=100, help='пачек на один бизнес за запуск')
+    parser.add_argument('--business-id', type=int, help='архивировать только этот бизнес')
+    args = parser.parse_args(argv)
+    
+    conn = index.get_db_connection()
+    try:
+        businesses = online_businesses(conn)
+        if args.business_id:
+            businesses = [row for row in businesses if row[0] == args.business_id]
+        
+        total = 0
+        for business_id, retention_days in businesses:
+            archived = archive_business_chat(conn, business_id, retention_days, args.batch_size, args.max_batches)
+            if archived:
+                print(f'{business_id}: {archived} сообщений в архиве')
+            total += archived
+    finally:
+        index.reset_db_connection()
+    
+    print(f'\nВсего перенесено: {total}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Замер холодного старта функций backend: каждый прогон — новый процесс Python,
+время от начала импорта index.py до первого ответа handler() и отчёт -X importtime
+по самым тяжёлым прямым импортам.
+
+Первый ответ — запрос только на чтение из READ_ONLY_EVENTS (прогоны не пишут в БД
+и каждый раз проходят один и тот же путь) или событие из --event.
+Без DATABASE_URL (или с --options) замеряется OPTIONS-запрос без обращения к БД.
+
+Пример:
+    python scripts/cold_start_bench.py --runs 5
+    python scripts/cold_start_bench.py --function businesses --event '{"httpMethod": "GET", ...}'
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Запросы только на чтение: функция -> (query-параметры, заголовки)
+READ_ONLY_EVENTS = {
+    'auth': ({'path': 'check-subscription', 'user_id': '1'}, {}),
+    'businesses': ({'path': 'businesses'}, {'X-User-Id': '1'}),
+    'community': ({'path': 'questions'}, {})
+}
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import index
+imported = time.perf_counter()
+response = index.handler(json.loads(sys.argv[2]), None)
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (finished - started) * 1000,
+    'status': response['statusCode']
+}))
+"""
+
+def build_event(function_name: str, options_only: bool) -> dict:
+    """Событие для первого запроса: GET только на чтение или OPTIONS"""
+    if options_only or function_name not in READ_ONLY_EVENTS:
+        return {'httpMethod': 'OPTIONS', 'headers': {}, 'queryStringParameters': {}}
+    
+    query, headers = READ_ONLY_EVENTS[function_name]
+    return {
+        'httpMethod': 'GET',
+        'headers': headers,
+        'queryStringParameters': query,
+        'requestContext': {'identity': {'sourceIp': '127.0.0.1'}}
+    }
+
+def parse_importtime(stderr: str, top: int):
+    """Самые тяжёлые прямые импорты index.py по кумулятивному времени (мс)"""
+    direct = []
+    for line in stderr.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or len(fields) != 3 or 'cumulative' in line:
+            continue
+        # Отступ имени — два пробела на уровень вложенности; index.py — уровень 0,
+        # и строки его вложенных импортов идут в выводе перед ним
+        name = fields[2][1:]
+        if not name.startswith(' '):
+            if name == 'index':
+                break
+            direct = []
+        elif not name.startswith('   '):
+            direct.append((name.strip(), int(fields[1]) / 1000))
+    return sorted(direct, key=lambda item: item[1], reverse=True)[:top]
+
+def run_once(function_dir: str, event: dict):
+    """Один холодный старт в отдельном процессе"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, function_dir, json.dumps(event)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Замер холодного старта функций backend')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help='сколько тяжёлых импортов показать')
+    parser.add_argument('--options', action='store_true', help='замерять OPTIONS-запрос без БД')
+    parser.add_argument('--function', help='замерять только эту функцию')
+    parser.add_argument('--event', help='событие первого запроса (JSON) вместо запроса из READ_ONLY_EVENTS')
+    args = parser.parse_args(argv)
+    if args.event and not args.function:
+        parser.error('--event задаётся вместе с --function')
+    
+    options_only = args.options or not os.environ.get('DATABASE_URL')
+    
+    for function_name in sorted(os.listdir(BACKEND_DIR)):
+        function_dir = os.path.join(BACKEND_DIR, function_name)
+        if not os.path.exists(os.path.join(function_dir, 'index.py')):
+            continue
+        if args.function and function_name != args.function:
+            continue
+        
+        event = json.loads(args.event) if args.event else build_event(function_name, options_only)
+        results = []
+        for _ in range(args.runs):
+            result, stderr = run_once(function_dir, event)
+            results.append(result)
+        
+        import_ms = statistics.median(r['import_ms'] for r in results)
+        response_ms = statistics.median(r['first_response_ms'] for r in results)
+        print(f"{function_name}: импорт {import_ms:.1f} мс, первый ответ {response_ms:.1f} мс "
+              f"({event['httpMethod']} {event.get('queryStringParameters', {}).get('path', '')}, "
+              f"статус {results[-1]['status']}, медиана из {args.runs})")
+        for name, cumulative_ms in parse_importtime(stderr, args.top):
+            print(f'    {name:<30} {cumulative_ms:8.1f} мс')
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Проверка планов запросов функций backend: каждый статический SQL из cur.execute()
+прогоняется через EXPLAIN (generic plan) на заполненной тестовыми данными БД, а SQL,
+собираемый в коде (поиск пользователей в админке), — на типичных сочетаниях фильтров.
+Проверка падает, если в плане есть Seq Scan по таблице, не внесённой в ALLOWED_SEQ_SCANS,
+или план не удалось построить.
+
+Запуск (на отдельной dev-БД с применёнными миграциями):
+    python scripts/explain_check.py --seed
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import re
+import sys
+
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+PARTITION_SUFFIX = re.compile(r'_(\d{4}_\d{2}|default)$')
+
+# Запросы, которым полный просмотр таблицы допустим: функция -> таблицы
+ALLOWED_SEQ_SCANS = {
+    'get_questions': {'questions', 'answers'},
+    'get_active_advertisement': {'advertisements'}
+}
+
+# Сочетания фильтров для динамических запросов админки (build_user_filters в auth)
+USER_FILTER_VARIANTS = [
+    {},
+    {'search': 'ab'},
+    {'search': 'user4242'},
+    {'search': 'user4242', 'is_blocked': False, 'is_verified': True},
+    {'is_premium': True, 'expiring_within_days': 7}
+]
+USERS_PAGE_CURSOR = {'created_at': '2020-01-01 00:00:00', 'id': 1000}
+BULK_USER_IDS = [1, 2, 3]
+
+SEED_SQL = """
+INSERT INTO users (username, email, password_hash, is_premium, is_blocked, is_verified, subscription_ends_at, created_at)
+SELECT 'user' || g, 'user' || g || '@example.com', md5(g::text), g % 3 = 0, g % 50 = 0, g % 7 = 0,
+       CURRENT_TIMESTAMP + (g % 60 - 20) * INTERVAL '1 day', CURRENT_TIMESTAMP - g * INTERVAL '1 minute'
+FROM generate_series(1, 50000) g;
+
+INSERT INTO sessions (token_hash, user_id, device, expires_at)
+SELECT md5(g::text) || md5((g + 1)::text), g % 50000 + 1, 'seed', CURRENT_TIMESTAMP + (g % 60 - 10) * INTERVAL '1 day'
+FROM generate_series(1, 50000) g;
+
+INSERT INTO session_revocations (user_id) SELECT g FROM generate_series(1, 50000, 10) g;
+
+INSERT INTO revoked_session_ids (sid, user_id, expires_at)
+SELECT md5(g::text), g % 50000 + 1, CURRENT_TIMESTAMP + (g % 14 - 7) * INTERVAL '1 day'
+FROM generate_series(1, 20000) g;
+
+INSERT INTO login_attempts (key, window_start, attempts)
+SELECT 'ip:10.0.' || (g / 256) || '.' || (g % 256), date_trunc('minute', CURRENT_TIMESTAMP), 1
+FROM generate_series(1, 20000) g;
+
+INSERT INTO businesses (user_id, name, is_online, online_code)
+SELECT g % 50000 + 1, 'Business ' || g, g % 4 = 0, CASE WHEN g % 4 = 0 THEN upper(substr(md5(g::text), 1, 20)) END
+FROM generate_series(1, 10000) g;
+
+INSERT INTO business_members (business_id, user_id, role)
+SELECT g % 10000 + 1, g % 50000 + 1, 'member' FROM generate_series(1, 30000) g
+ON CONFLICT DO NOTHING;
+
+INSERT INTO business_notes (business_id, content) SELECT g, 'note' FROM generate_series(1, 10000) g;
+
+INSERT INTO transactions (business_id, type, amount, category, date, created_by)
+SELECT g % 10000 + 1, CASE WHEN g % 3 = 0 THEN 'expense' ELSE 'income' END, g % 1000, 'cat' || g % 12,
+       CURRENT_TIMESTAMP - (g % 365) * INTERVAL '1 day', g % 50000 + 1
+FROM generate_series(1, 300000) g;
+
+INSERT INTO business_monthly_rollups (business_id, month, category, income, expense, transaction_count)
+SELECT business_id, date_trunc('month', date)::date, category,
+       COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0),
+       COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0),
+       COUNT(*)
+FROM transactions
+GROUP BY 1, 2, 3
+ON CONFLICT DO NOTHING;
+
+INSERT INTO business_chat (business_id, user_id, message, created_at)
+SELECT g % 10000 + 1, g % 50000 + 1, 'message ' || g, CURRENT_TIMESTAMP - (g % 365) * INTERVAL '1 day'
+FROM generate_series(1, 200000) g;
+
+INSERT INTO business_chat_archives
+    (business_id, first_message_id, last_message_id, first_created_at, last_created_at, message_count, payload)
+SELECT g % 10000 + 1, g * 100, g * 100 + 99, CURRENT_TIMESTAMP - INTERVAL '1 year', CURRENT_TIMESTAMP - INTERVAL '1 year',
+       100, convert_to('{}', 'UTF8')
+FROM generate_series(1, 20000) g;
+
+INSERT INTO idempotency_keys (user_id, idempotency_key, endpoint, request_hash, response, expires_at)
+SELECT g % 50000 + 1, md5(g::text), 'transaction', md5(g::text) || md5(g::text), '{}',
+       CURRENT_TIMESTAMP + (g % 48 - 24) * INTERVAL '1 hour'
+FROM generate_series(1, 50000) g;
+
+INSERT INTO advertisements (title, content, is_active) SELECT 'ad', 'ad', g = 1 FROM generate_series(1, 20) g;
+
+INSERT INTO questions (user_id, title, content, category)
+SELECT g % 50000 + 1, 'q' || g, 'q', 'cat' || g % 10 FROM generate_series(1, 20000) g;
+
+INSERT INTO answers (question_id, user_id, content)
+SELECT g % 20000 + 1, g % 50000 + 1, 'a' FROM generate_series(1, 60000) g;
+
+INSERT INTO answer_likes (answer_id, user_id)
+SELECT g % 60000 + 1, g % 50000 + 1 FROM generate_series(1, 100000) g
+ON CONFLICT DO NOTHING;
+
+ANALYZE;
+"""
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def collect_queries(path: str):
+    """Статические SQL из вызовов *.execute() в файле и список пропущенных динамических"""
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read())
+    
+    # SQL, вынесенный в константы модуля (например, USER_BUSINESSES_SQL)
+    constants = {}
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)):
+            constants[node.targets[0].id] = node.value.value
+    
+    queries = []
+    skipped = []
+    for function in ast.walk(tree):
+        if not isinstance(function, ast.FunctionDef):
+            continue
+        for node in ast.walk(function):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr == 'execute' and node.args):
+                continue
+            sql = node.args[0]
+            if isinstance(sql, ast.Constant) and isinstance(sql.value, str):
+                queries.append((function.name, node.lineno, sql.value))
+            elif isinstance(sql, ast.Name) and sql.id in constants:
+                queries.append((function.name, node.lineno, constants[sql.id]))
+            else:
+                skipped.append((function.name, node.lineno))
+    return queries, skipped
+
+def to_prepared(sql: str) -> str:
+    """Замена плейсхолдеров psycopg2 (%s) на $1, $2, ..."""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub('%s', lambda _: f'${next(counter)}', sql).replace('%%', '%')
+
+def seq_scans(plan):
+    """Таблицы (с секциями, сведёнными к родителю), которые план читает полным просмотром"""
+    tables = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.add(PARTITION_SUFFIX.sub('', plan['Relation Name']))
+    for child in plan.get('Plans', []):
+        tables |= seq_scans(child)
+    return tables
+
+def explain(cur, sql: str):
+    """Generic-план запроса: параметры не подставляются, как у prepared statement"""
+    prepared = to_prepared(sql)
+    params = sql.count('%s')
+    cur.execute(f"PREPARE explain_check AS {prepared}")
+    try:
+        args = ', '.join(['NULL'] * params)
+        cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE explain_check{f'({args})' if params else ''}")
+        return cur.fetchone()[0][0]['Plan']
+    finally:
+        cur.execute("DEALLOCATE explain_check")
+
+def load_function(function_name: str):
+    """Модуль index.py функции backend (для сборки динамических запросов)"""
+    path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+    spec = importlib.util.spec_from_file_location(f'{function_name}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def dynamic_queries():
+    """Варианты динамических запросов auth: (функция, описание варианта, SQL, параметры)"""
+    auth = load_function('auth')
+    
+    for variant in USER_FILTER_VARIANTS:
+        for cursor in (None, USERS_PAGE_CURSOR):
+            sql, params = auth.admin_users_query(variant, cursor, auth.ADMIN_USERS_PAGE_SIZE)
+            label = json.dumps(variant, ensure_ascii=False) + (' cursor' if cursor else '')
+            yield 'admin_get_users', label, sql, params
+    
+    selections = [(['id = ANY(%s)'], [BULK_USER_IDS], 'user_ids')]
+    for variant in USER_FILTER_VARIANTS[1:]:
+        conditions, params = auth.build_user_filters(variant)
+        selections.append((conditions, params, json.dumps(variant, ensure_ascii=False)))
+    
+    for action in auth.BULK_MODERATION_ACTIONS:
+        for conditions, params, label in selections:
+            for dry_run in (True, False):
+                sql, query_params = auth.bulk_moderation_query(action, conditions, params, dry_run)
+                yield 'admin_bulk_moderate', f"{action} {label}{' dry_run' if dry_run else ''}", sql, query_params
+
+def check_plan(cur, name: str, label: str, build_plan, verbose: bool) -> int:
+    """Построить план и проверить его на Seq Scan; 1 — нарушение или ошибка планирования"""
+    cur.execute("SAVEPOINT explain_check")
+    try:
+        plan = build_plan()
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT explain_check")
+        print(f'FAIL {label} не удалось построить план: {e.pgerror or e}')
+        return 1
+    
+    violations = seq_scans(plan) - ALLOWED_SEQ_SCANS.get(name, set())
+    if violations:
+        print(f'FAIL {label} Seq Scan: {", ".join(sorted(violations))}')
+        if verbose:
+            print(json.dumps(plan, indent=2, ensure_ascii=False))
+        return 1
+    
+    print(f'OK   {label}')
+    return 0
+
+def explain_literal(cur, sql: str, params):
+    """План запроса с подставленными параметрами: psycopg2 подставляет их на клиенте так же"""
+    cur.execute(f"EXPLAIN (FORMAT JSON) {cur.mogrify(sql, params).decode()}")
+    return cur.fetchone()[0][0]['Plan']
+
+def check(conn, verbose: bool = False) -> int:
+    """Прогнать все запросы всех функций; вернуть число нарушений"""
+    failures = 0
+    with conn.cursor() as cur:
+        cur.execute("SET plan_cache_mode = force_generic_plan")
+        
+        for function_name in sorted(os.listdir(BACKEND_DIR)):
+            path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+            if not os.path.exists(path):
+                continue
+            
+            queries, skipped = collect_queries(path)
+            for name, lineno in skipped:
+                print(f'SKIP {function_name}/{name}:{lineno} (динамический SQL)')
+            
+            for name, lineno, sql in queries:
+                if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                    continue
+                failures += check_plan(
+                    cur, name, f'{function_name}/{name}:{lineno}', lambda: explain(cur, sql), verbose
+                )
+        
+        for name, label, sql, params in dynamic_queries():
+            failures += check_plan(
+                cur, name, f'auth/{name} {label}', lambda: explain_literal(cur, sql, params), verbose
+            )
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Проверка планов запросов backend на Seq Scan')
+    parser.add_argument('--seed', action='store_true', help='заполнить БД тестовыми данными (откатывается)')
+    parser.add_argument('--verbose', action='store_true', help='печатать план для нарушений')
+    args = parser.parse_args(argv)
+    
+    conn = get_db_connection()
+    try:
+        if args.seed:
+            with conn.cursor() as cur:
+                cur.execute(SEED_SQL)
+        failures = check(conn, args.verbose)
+    finally:
+        conn.rollback()
+        conn.close()
+    
+    print(f'\nНарушений: {failures}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Обслуживание помесячных секций transactions и business_chat:
+создание секций наперёд, отсоединение, присоединение и архивирование старых месяцев.
+
+Примеры:
+    python scripts/partitions.py ensure --months-ahead 3
+    python scripts/partitions.py detach --before 2025-01
+    python scripts/partitions.py attach --table transactions --month 2024-12
+    python scripts/partitions.py archive --before 2025-01 --dir /var/backups/partitions
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+
+PARTITIONED_TABLES = {
+    'transactions': 'date',
+    'business_chat': 'created_at'
+}
+PARTITION_NAME = re.compile(r'^(?P<parent>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$')
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def parse_month(value: str) -> date:
+    """Разбор месяца в формате YYYY-MM"""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
+
+def add_months(month: date, count: int) -> date:
+    """Сдвиг первого числа месяца на count месяцев"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    """Имя секции месяца, как его задаёт create_monthly_partition()"""
+    return f"{table}_{month:%Y_%m}"
+
+def list_partitions(cur, table: str):
+    """Помесячные секции таблицы: [(имя, первое число месяца)] по возрастанию"""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match and match.group('parent') == table:
+            partitions.append((name, date(int(match.group('year')), int(match.group('month')), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+def ensure_partition(cur, table: str, month: date):
+    """Создать секцию месяца; строки этого месяца из DEFAULT-секции переносятся в неё"""
+    key = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    default = f'{table}_default'
+    
+    cur.execute(f"""
+        SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= %s AND {key} < %s)
+    """, (month, add_months(month, 1)))
+    has_default_rows = cur.fetchone()[0]
+    
+    if not has_default_rows:
+        cur.execute("SELECT create_monthly_partition(%s, %s)", (table, month))
+        return name
+    
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+    cur.execute("SELECT create_monthly_partition(%s, %s)", (table, month))
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {default} WHERE {key} >= %s AND {key} < %s
+            RETURNING *
+        )
+        INSERT INTO {table} SELECT * FROM moved
+    """, (month, add_months(month, 1)))
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+    return name
+
+def ensure(conn, months_ahead: int):
+    """Создать секции с текущего месяца на months_ahead месяцев вперёд"""
+    current = date.today().replace(day=1)
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            for offset in range(months_ahead + 1):
+                name = ensure_partition(cur, table, add_months(current, offset))
+                conn.commit()
+                print(f'{table}: {name}')
+
+def detach(conn, before: date):
+    """Отсоединить секции месяцев раньше before; возвращает имена отсоединённых таблиц"""
+    detached = []
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            for name, month in list_partitions(cur, table):
+                if month >= before:
+                    continue
+                cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                conn.commit()
+                detached.append(name)
+                print(f'{table}: отсоединена {name}')
+    return detached
+
+def attach(conn, table: str, month: date):
+    """Присоединить ранее отсоединённую секцию обратно"""
+    name = partition_name(table, month)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            ALTER TABLE {table} ATTACH PARTITION {name}
+            FOR VALUES FROM (%s) TO (%s)
+        """, (month, add_months(month, 1)))
+        conn.commit()
+    print(f'{table}: присоединена {name}')
+
+def archive(conn, before: date, directory: str):
+    """Отсоединить старые секции, выгрузить их в gzip CSV и удалить"""
+    os.makedirs(directory, exist_ok=True)
+    with conn.cursor() as cur:
+        for name in detach(conn, before):
+            path = os.path.join(directory, f'{name}.csv.gz')
+            with gzip.open(path, 'wb') as archive_file:
+                cur.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive_file)
+            cur.execute(f"DROP TABLE {name}")
+            conn.commit()
+            print(f'{name}: выгружена в {path} и удалена')
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Обслуживание помесячных секций')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    ensure_parser = commands.add_parser('ensure', help='создать секции наперёд')
+    ensure_parser.add_argument('--months-ahead', type=int, default=3)
+    
+    detach_parser = commands.add_parser('detach', help='отсоединить старые секции')
+    detach_parser.add_argument('--before', type=parse_month, required=True)
+    
+    attach_parser = commands.add_parser('attach', help='присоединить секцию обратно')
+    attach_parser.add_argument('--table', choices=sorted(PARTITIONED_TABLES), required=True)
+    attach_parser.add_argument('--month', type=parse_month, required=True)
+    
+    archive_parser = commands.add_parser('archive', help='выгрузить и удалить старые секции')
+    archive_parser.add_argument('--before', type=parse_month, required=True)
+    archive_parser.add_argument('--dir', required=True)
+    
+    args = parser.parse_args(argv)
+    conn = get_db_connection()
+    try:
+        if args.command == 'ensure':
+            ensure(conn, args.months_ahead)
+        elif args.command == 'detach':
+            detach(conn, args.before)
+        elif args.command == 'attach':
+            attach(conn, args.table, args.month)
+        elif args.command == 'archive':
+            archive(conn, args.before, args.dir)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
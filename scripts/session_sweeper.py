@@ -0,0 +1,35 @@
+"""
+Очистка просроченных сессий 'Запомнить меня': пачки по SESSION_SWEEP_BATCH удаляются,
+пока просроченные сессии не закончатся. Запускается по расписанию, например раз в час;
+admin/sweep-sessions делает то же самое, но не больше SESSION_SWEEP_MAX_BATCHES пачек за запрос.
+
+Пример:
+    DATABASE_URL=... python scripts/session_sweeper.py --batch-size 1000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'auth'))
+
+import index  # noqa: E402
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Очистка просроченных сессий')
+    parser.add_argument('--batch-size', type=int, default=index.SESSION_SWEEP_BATCH)
+    parser.add_argument('--max-batches', type=int, default=1000, help='пачек за запуск')
+    args = parser.parse_args(argv)
+    
+    conn = index.get_db_connection()
+    try:
+        deleted, has_more = index.sweep_expired_sessions(conn, args.batch_size, args.max_batches)
+    finally:
+        index.reset_db_connection()
+    
+    print(f'Удалено сессий: {deleted}')
+    if has_more:
+        print('Остались просроченные сессии: лимит пачек исчерпан')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())